@@ -0,0 +1,208 @@
+import bisect
+import threading
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta
+
+from referencias import ORDEM_LIVROS, analisar_referencia, chave_ordenacao
+
+
+# Semana ISO de uma data DD/MM/AAAA ("2024-W05"); None se a data for inválida
+def semana_iso(data):
+    try:
+        ano, semana, _ = datetime.strptime((data or "").strip(), "%d/%m/%Y").isocalendar()
+    except ValueError:
+        return None
+    return f"{ano}-W{semana:02d}"
+
+
+def intervalo_semana(semana):
+    ano, numero = semana.split("-W")
+    inicio = date.fromisocalendar(int(ano), int(numero), 1)
+    return inicio, inicio + timedelta(days=6)
+
+
+# Contribuição de uma anotação para os contadores, com o que é caro de
+# calcular (chave de ordenação da passagem, semana ISO) resolvido uma vez só
+Contribuicao = namedtuple("Contribuicao", "tema livro passagem chave_passagem semana")
+
+
+# Remover/inserir uma chave em uma lista mantida ordenada
+def _tirar_ordenado(lista, chave):
+    del lista[bisect.bisect_left(lista, chave)]
+
+
+# Contadores do /resumo (por tema, por livro, por semana ISO), mantidos
+# incrementalmente a partir das notificações do repositório. Cada anotação
+# guarda sua contribuição para que editar/remover apenas a subtraia.
+#
+# Além das contagens, a ordem de exibição é mantida em listas ordenadas
+# (bisect), e a parte do resumo de cada livro fica em cache: uma escrita só
+# mexe no seu tema, no seu livro e na sua semana, e montar o resumo depois
+# dela não ordena nem analisa passagens de novo. Uma recarga externa (outro
+# worker, download do Dropbox) marca os contadores para reconstrução.
+class Agregados:
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+        self._lock = threading.RLock()
+        self._zerar()
+        self._sujo = True
+        self._geracao = 0
+        self.reconstrucoes = 0
+        repositorio.observar(self._ao_alterar)
+
+    def _zerar(self):
+        self._contribuicoes = {}
+        self._temas = Counter()
+        self._ordem_temas = []
+        self._livros = Counter()
+        self._ordem_livros = []
+        self._passagens = {}
+        self._ordem_passagens = {}
+        self._semanas = Counter()
+        self._ordem_semanas = []
+        self._intervalos = {}
+        self._resumo_livros = {}
+        self._resumo = None
+
+    def _ao_alterar(self, evento, dados):
+        with self._lock:
+            self._resumo = None
+            self._geracao += 1
+            if evento == "recarregar":
+                self._sujo = True
+            elif self._sujo:
+                return
+            elif evento == "remover":
+                self._subtrair(dados)
+            else:
+                self._subtrair(dados["id"])
+                self._somar(dados)
+
+    def _somar(self, anotacao):
+        passagem = anotacao.get("passagem_biblica", "")
+        referencia = analisar_referencia(passagem)
+        contribuicao = Contribuicao(
+            anotacao.get("tema", ""), referencia.livro, passagem,
+            chave_ordenacao(referencia), semana_iso(anotacao.get("data")),
+        )
+        self._contribuicoes[anotacao["id"]] = contribuicao
+        tema, livro = contribuicao.tema, contribuicao.livro
+
+        if self._temas[tema]:
+            _tirar_ordenado(self._ordem_temas, (-self._temas[tema], tema))
+        self._temas[tema] += 1
+        bisect.insort(self._ordem_temas, (-self._temas[tema], tema))
+
+        if not self._livros[livro]:
+            bisect.insort(self._ordem_livros, (ORDEM_LIVROS.get(livro, len(ORDEM_LIVROS)), livro))
+            self._passagens[livro] = Counter()
+            self._ordem_passagens[livro] = []
+        self._livros[livro] += 1
+        if not self._passagens[livro][passagem]:
+            bisect.insort(self._ordem_passagens[livro], (contribuicao.chave_passagem, passagem))
+        self._passagens[livro][passagem] += 1
+        self._resumo_livros.pop(livro, None)
+
+        semana = contribuicao.semana
+        if semana:
+            if not self._semanas[semana]:
+                bisect.insort(self._ordem_semanas, semana)
+                if semana not in self._intervalos:
+                    inicio, fim = intervalo_semana(semana)
+                    self._intervalos[semana] = (inicio.strftime("%d/%m/%Y"), fim.strftime("%d/%m/%Y"))
+            self._semanas[semana] += 1
+
+    def _subtrair(self, id_anotacao):
+        contribuicao = self._contribuicoes.pop(id_anotacao, None)
+        if contribuicao is None:
+            return
+        tema, livro, passagem, chave_passagem, semana = contribuicao
+
+        _tirar_ordenado(self._ordem_temas, (-self._temas[tema], tema))
+        if self._decrementar(self._temas, tema):
+            bisect.insort(self._ordem_temas, (-self._temas[tema], tema))
+
+        if not self._decrementar(self._passagens[livro], passagem):
+            _tirar_ordenado(self._ordem_passagens[livro], (chave_passagem, passagem))
+        if not self._decrementar(self._livros, livro):
+            _tirar_ordenado(self._ordem_livros, (ORDEM_LIVROS.get(livro, len(ORDEM_LIVROS)), livro))
+            del self._passagens[livro]
+            del self._ordem_passagens[livro]
+        self._resumo_livros.pop(livro, None)
+
+        if semana and not self._decrementar(self._semanas, semana):
+            _tirar_ordenado(self._ordem_semanas, semana)
+
+    # Decrementar e apagar a chave quando zera; devolve a contagem restante
+    @staticmethod
+    def _decrementar(contador, chave):
+        contador[chave] -= 1
+        if contador[chave] <= 0:
+            del contador[chave]
+            return 0
+        return contador[chave]
+
+    def _reconstruir(self, anotacoes):
+        self._zerar()
+        for anotacao in anotacoes:
+            self._somar(anotacao)
+        self._sujo = False
+        self.reconstrucoes += 1
+
+    def _resumo_livro(self, livro):
+        resumo = self._resumo_livros.get(livro)
+        if resumo is None:
+            passagens = self._passagens[livro]
+            resumo = self._resumo_livros[livro] = {
+                "livro": livro,
+                "quantidade": self._livros[livro],
+                "passagens": [
+                    {"passagem": passagem, "quantidade": passagens[passagem]}
+                    for _, passagem in self._ordem_passagens[livro]
+                ],
+            }
+        return resumo
+
+    def _montar_resumo(self):
+        return {
+            "total": len(self._contribuicoes),
+            "temas": [{"tema": tema, "quantidade": -negativa} for negativa, tema in self._ordem_temas],
+            "livros": [self._resumo_livro(livro) for _, livro in self._ordem_livros],
+            "semanas": [
+                {
+                    "semana": semana,
+                    "inicio": self._intervalos[semana][0],
+                    "fim": self._intervalos[semana][1],
+                    "quantidade": self._semanas[semana],
+                }
+                for semana in self._ordem_semanas
+            ],
+        }
+
+    # Resumo atual; só remonta se algo mudou desde a última chamada
+    def resumo(self):
+        # Deixa o repositório perceber alterações feitas por outros workers
+        self.repositorio.revalidar()
+        while True:
+            with self._lock:
+                if not self._sujo:
+                    if self._resumo is None:
+                        self._resumo = self._montar_resumo()
+                    return self._resumo
+                geracao = self._geracao
+            # A listagem é lida sem segurar self._lock: as notificações chegam com
+            # a trava do repositório já tomada, e a ordem inversa travaria as threads
+            anotacoes = self.repositorio.listar()
+            with self._lock:
+                if self._geracao == geracao:
+                    self._reconstruir(anotacoes)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "reconstrucoes": self.reconstrucoes,
+                "anotacoes": len(self._contribuicoes),
+                "temas": len(self._temas),
+                "livros": len(self._livros),
+                "semanas": len(self._semanas),
+            }
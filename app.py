@@ -1,111 +1,251 @@
-from flask import Flask, render_template, request, redirect, url_for, abort
-import json
+from flask import Flask, Response, render_template, stream_template, stream_with_context, request, redirect, url_for, abort, jsonify, g
+import click
 import os
-import shutil
 import atexit
 from dotenv import load_dotenv
 import dropbox
 import logging
-from datetime import datetime
+import math
+import re
+import threading
+import time
+from agregados import Agregados
+from arquivos import gravar_json_atomico
+from gerenciador_backup import GerenciadorBackup
+from metricas import ClienteInstrumentado, medir, metricas
+from referencias import identificar_livro
+from repositorio import ORDENS, criar_repositorio, data_iso, ler_json_anotacoes
+from sincronizacao import ClienteDropboxFalso, ClientePreguicoso, FilaUpload, SincronizadorDropbox
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Obter o token de acesso do Dropbox a partir das variáveis de ambiente
-DROPBOX_ACCESS_TOKEN = os.getenv('DROPBOX_ACCESS_TOKEN')
-if not DROPBOX_ACCESS_TOKEN:
-    raise ValueError("O token de acesso do Dropbox não está definido. Verifique a configuração.")
-
-# Inicializar o cliente do Dropbox
-dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
-
 # Arquivo JSON onde as anotações serão armazenadas
 ANOTACOES_FILE = "anotacoes_culto.json"
 DROPBOX_FILE_PATH = '/anotacoes_culto.json'
 BACKUP_DIR = "backups"
 
+# Intervalo (segundos) da sincronização em segundo plano com o Dropbox; 0 desativa
+DROPBOX_SYNC_INTERVAL = float(os.getenv('DROPBOX_SYNC_INTERVAL', '60'))
+# Diretório local usado no lugar do Dropbox (testes e benchmarks offline)
+DROPBOX_FAKE_DIR = os.getenv('DROPBOX_FAKE_DIR')
+# Janela (segundos) em que gravações seguidas são agrupadas em um único upload
+DROPBOX_UPLOAD_WINDOW = float(os.getenv('DROPBOX_UPLOAD_WINDOW', '2'))
+# Backend de armazenamento: "json" (arquivo único), "diario" (journal + snapshot) ou "sqlite" (banco com índices)
+ARMAZENAMENTO = os.getenv('ARMAZENAMENTO', 'json')
+# Retenção dos backups: o mais recente de cada uma das últimas N horas, dias e semanas
+BACKUP_RETER_HORAS = int(os.getenv('BACKUP_RETER_HORAS', '24'))
+BACKUP_RETER_DIAS = int(os.getenv('BACKUP_RETER_DIAS', '14'))
+BACKUP_RETER_SEMANAS = int(os.getenv('BACKUP_RETER_SEMANAS', '8'))
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 
-# Funções de sincronização com Dropbox
-def upload_to_dropbox(local_file_path, dropbox_path):
-    try:
-        with open(local_file_path, 'rb') as f:
-            dbx.files_upload(f.read(), dropbox_path, mode=dropbox.files.WriteMode.overwrite)
-        logging.info("Arquivo enviado com sucesso para o Dropbox.")
-    except Exception as e:
-        logging.error(f"Erro ao enviar o arquivo para o Dropbox: {e}")
-
-def download_from_dropbox(dropbox_path, local_file_path):
-    try:
-        dbx.files_download_to_file(local_file_path, dropbox_path)
-        logging.info("Arquivo baixado com sucesso do Dropbox.")
-    except Exception as e:
-        logging.error(f"Erro ao baixar o arquivo do Dropbox: {e}")
+# Cliente real do Dropbox, a partir do token das variáveis de ambiente
+def conectar_dropbox():
+    if not DROPBOX_ACCESS_TOKEN:
+        raise ValueError("O token de acesso do Dropbox não está definido. Verifique a configuração.")
+    return dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
 
-def obter_metadata_dropbox(caminho_arquivo):
-    try:
-        metadata = dbx.files_get_metadata(caminho_arquivo)
-        return metadata.server_modified
-    except dropbox.exceptions.ApiError as e:
-        logging.error(f"Erro ao obter metadata do Dropbox: {e}")
-        return None
-
-def verificar_e_baixar_arquivo():
-    timestamp_dropbox = obter_metadata_dropbox(DROPBOX_FILE_PATH)
-    if timestamp_dropbox is None:
-        return
-
-    if os.path.exists(ANOTACOES_FILE):
-        timestamp_local = datetime.fromtimestamp(os.path.getmtime(ANOTACOES_FILE))
-        if timestamp_dropbox <= timestamp_local:
-            logging.info("O arquivo local está atualizado com a versão do Dropbox. Nenhum download necessário.")
-            return
-
-    download_from_dropbox(DROPBOX_FILE_PATH, ANOTACOES_FILE)
+# Inicializar o cliente do Dropbox
+if DROPBOX_FAKE_DIR:
+    dbx = ClienteDropboxFalso(DROPBOX_FAKE_DIR)
+else:
+    # Obter o token de acesso do Dropbox a partir das variáveis de ambiente
+    DROPBOX_ACCESS_TOKEN = os.getenv('DROPBOX_ACCESS_TOKEN')
+    if click.get_current_context(silent=True) is None:
+        dbx = conectar_dropbox()
+    else:
+        # Comando do flask CLI: o token só é exigido se o comando usar o Dropbox
+        dbx = ClientePreguicoso(conectar_dropbox)
+# Contar e cronometrar todas as chamadas ao Dropbox (expostas em /metrics)
+dbx = ClienteInstrumentado(dbx, metricas)
+
+# Envio ao Dropbox em segundo plano: gravações próximas viram um único upload.
+# Antes de cada envio o repositório é exportado para o JSON (no-op no backend json).
+fila_upload = FilaUpload(
+    dbx, ANOTACOES_FILE, DROPBOX_FILE_PATH, janela=DROPBOX_UPLOAD_WINDOW,
+    preparar=lambda: repositorio.exportar_json(ANOTACOES_FILE),
+)
+atexit.register(fila_upload.descarregar)
+
+# Sincronização em segundo plano: as rotas só leem o armazenamento local
+sincronizador = SincronizadorDropbox(
+    dbx, DROPBOX_FILE_PATH, ANOTACOES_FILE,
+    intervalo=DROPBOX_SYNC_INTERVAL, fila_upload=fila_upload,
+)
+
+# Repositório com cache em memória, no backend escolhido em ARMAZENAMENTO
+repositorio = criar_repositorio(
+    ARMAZENAMENTO, ANOTACOES_FILE,
+    ao_faltar_arquivo=sincronizador.baixar,
+)
+# O download só substitui o arquivo se nenhuma escrita (deste ou de outro worker)
+# aconteceu enquanto baixava
+sincronizador.trava = repositorio.travar_escritas()
+sincronizador.versao_local = repositorio.versao
+if ARMAZENAMENTO != "json":
+    # Uma versão nova baixada do Dropbox substitui o conteúdo do repositório
+    sincronizador.ao_baixar = lambda: repositorio.importar(ler_json_anotacoes(ANOTACOES_FILE))
+
+# Contadores do /resumo, atualizados a cada escrita no repositório
+agregados = Agregados(repositorio)
 
 # Carregar anotações de um arquivo JSON
 def carregar_anotacoes():
-    if not os.path.exists(ANOTACOES_FILE):
-        download_from_dropbox(DROPBOX_FILE_PATH, ANOTACOES_FILE)
-    try:
-        with open(ANOTACOES_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        logging.error("Erro ao decodificar o arquivo JSON.")
-        return []
+    return repositorio.carregar()
 
 # Salvar anotações em um arquivo JSON
 def salvar_anotacoes(anotacoes):
     try:
-        with open(ANOTACOES_FILE, "w", encoding="utf-8") as f:
-            json.dump(anotacoes, f, ensure_ascii=False, indent=4)
-        upload_to_dropbox(ANOTACOES_FILE, DROPBOX_FILE_PATH)
+        with medir("save"):
+            repositorio.importar(anotacoes)
+        fila_upload.agendar()
     except IOError:
         logging.error("Erro ao salvar o arquivo JSON.")
 
-# Criar um backup do arquivo JSON na pasta de backups
+# Executar uma escrita no repositório e agendar o envio ao Dropbox
+def alterar_anotacoes(operacao, *args):
+    try:
+        with medir("save"):
+            resultado = operacao(*args)
+    except IOError:
+        logging.error("Erro ao salvar as anotações.")
+        return None
+    if resultado is not False:
+        fila_upload.agendar()
+    return resultado
+
+# Backups deduplicados e comprimidos na pasta de backups (ver gerenciador_backup.py)
+gerenciador_backup = GerenciadorBackup(
+    BACKUP_DIR, ANOTACOES_FILE,
+    preparar=lambda: repositorio.exportar_json(ANOTACOES_FILE),
+    reter_horas=BACKUP_RETER_HORAS, reter_dias=BACKUP_RETER_DIAS, reter_semanas=BACKUP_RETER_SEMANAS,
+)
+
+# Criar um backup das anotações, se mudaram desde o último
 def criar_backup():
-    if not os.path.exists(BACKUP_DIR):
-        os.makedirs(BACKUP_DIR)
-    data_hora = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_file = os.path.join(BACKUP_DIR, f"anotacoes_culto_backup_{data_hora}.json")
     try:
-        shutil.copy(ANOTACOES_FILE, backup_file)
-        logging.info(f"Backup criado com sucesso: {backup_file}")
-    except IOError as e:
+        with medir("backup"):
+            snapshot = gerenciador_backup.criar()
+    except (IOError, ValueError) as e:
         logging.error(f"Erro ao criar backup: {e}")
-
-# Registrar função de finalização para criar backup
-atexit.register(criar_backup)
+        return
+    if snapshot:
+        logging.info(f"Backup criado com sucesso: {snapshot['id']}")
+
+# Serviços do servidor: sincronização periódica com o Dropbox e backup na saída
+# do worker. Só começam na primeira requisição, para que os comandos do CLI
+# (flask backups listar, flask migrar...) não iniciem a thread de sincronização
+# nem criem snapshots ao terminar.
+_servicos_iniciados = False
+_lock_servicos = threading.Lock()
+
+def iniciar_servicos():
+    global _servicos_iniciados
+    with _lock_servicos:
+        if _servicos_iniciados:
+            return
+        _servicos_iniciados = True
+    sincronizador.iniciar()
+    # Registrar função de finalização para criar backup
+    atexit.register(criar_backup)
 
 app = Flask(__name__)
 
+# Renderizar um template medindo a fase "render"
+def renderizar(template, **contexto):
+    with medir("render"):
+        return render_template(template, **contexto)
+
+# Instrumentação: latência por rota e fases de cada requisição (ver metricas.py).
+# A medição termina no teardown, que nas respostas em streaming só roda ao fim do envio.
+@app.before_request
+def garantir_servicos():
+    if not _servicos_iniciados:
+        iniciar_servicos()
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+    g.token_metricas = metricas.iniciar_requisicao()
+
+@app.after_request
+def registrar_status(resposta):
+    g.status_resposta = resposta.status_code
+    return resposta
+
+@app.teardown_request
+def finalizar_medicao(erro=None):
+    if 'token_metricas' not in g:
+        return
+    rota = request.url_rule.rule if request.url_rule else '<sem rota>'
+    status = g.get('status_resposta', 500)
+    metricas.finalizar_requisicao(
+        g.pop('token_metricas'), request.method, rota, status, time.perf_counter() - g.inicio_requisicao
+    )
+
+# Paginação da listagem
+POR_PAGINA_PADRAO = 20
+POR_PAGINA_MAXIMO = 100
+# Limite do número da página antes de consultar (o OFFSET do SQLite é um inteiro de 64 bits)
+PAGINA_MAXIMA = 10 ** 9
+
+# Aceitar datas do filtro como AAAA-MM-DD (input type="date") ou DD/MM/AAAA
+def data_do_filtro(valor):
+    valor = (valor or '').strip()
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", valor):
+        return valor
+    return data_iso(valor)
+
+# Aceitar o livro do filtro abreviado ou sem acento ("1Co" -> "1 Coríntios")
+def livro_do_filtro(valor):
+    valor = (valor or '').strip()
+    return identificar_livro(valor)[0] or valor or None
+
+# Ler filtros e ordenação da query string
+def filtros_da_requisicao():
+    ordem = request.args.get('ordem', 'data_desc')
+    return {
+        "tema": request.args.get('tema', '').strip() or None,
+        "livro": livro_do_filtro(request.args.get('livro')),
+        "data_inicio": data_do_filtro(request.args.get('de')),
+        "data_fim": data_do_filtro(request.args.get('ate')),
+        "ordem": ordem if ordem in ORDENS else 'data_desc',
+    }
+
 @app.route('/')
 def index():
-    verificar_e_baixar_arquivo()
-    anotacoes = carregar_anotacoes()
-    return render_template('index.html', anotacoes=anotacoes, enumerate=enumerate)
+    pagina = min(max(request.args.get('pagina', 1, type=int), 1), PAGINA_MAXIMA)
+    por_pagina = min(max(request.args.get('por_pagina', POR_PAGINA_PADRAO, type=int), 1), POR_PAGINA_MAXIMO)
+    filtros = filtros_da_requisicao()
+    anotacoes, total = repositorio.consultar(**filtros, limite=por_pagina, deslocamento=(pagina - 1) * por_pagina)
+    paginas = max(math.ceil(total / por_pagina), 1)
+    if pagina > paginas:
+        # Página além do fim: mostrar a última
+        pagina = paginas
+        anotacoes, total = repositorio.consultar(**filtros, limite=por_pagina, deslocamento=(pagina - 1) * por_pagina)
+    # Parâmetros atuais, para os links de paginação e exportação manterem os filtros
+    parametros = {chave: valor for chave, valor in request.args.items() if chave != 'pagina' and valor}
+    return renderizar(
+        'index.html', anotacoes=anotacoes, total=total, pagina=pagina,
+        paginas=paginas, parametros=parametros,
+    )
+
+# Exportação completa (texto integral) renderizada em streaming: o tempo até o
+# primeiro byte e a memória do worker não crescem com o tamanho da coleção
+@app.route('/exportar')
+def exportar():
+    gerado = stream_template('exportar.html', anotacoes=repositorio.iterar(**filtros_da_requisicao()))
+    return stream_with_context(metricas.medir_iteracao('render', gerado))
+
+# Busca textual em tema, passagem, anotações e devocional
+@app.route('/buscar')
+def buscar():
+    consulta = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limite', POR_PAGINA_PADRAO, type=int), 1), POR_PAGINA_MAXIMO)
+    resultados = repositorio.buscar(consulta, limite) if consulta else []
+    return renderizar('buscar.html', consulta=consulta, resultados=resultados)
 
 @app.route('/adicionar', methods=['GET', 'POST'])
 def adicionar():
@@ -133,84 +273,176 @@ def adicionar():
             "devocional": devocional
         }
         
-        anotacoes = carregar_anotacoes()
-        anotacoes.append(anotacao)
-        salvar_anotacoes(anotacoes)
+        alterar_anotacoes(repositorio.adicionar, anotacao)
         
         return redirect(url_for('index'))
     
-    return render_template('adicionar.html')
-
-@app.route('/editar/<int:index>', methods=['GET', 'POST'])
-def editar(index):
-    anotacoes = carregar_anotacoes()
-    if 0 <= index < len(anotacoes):
-        if request.method == 'POST':
-            data = request.form.get('data', '').strip()
-            tema = request.form.get('tema', '').strip()
-            passagem_biblica = request.form.get('passagem_biblica', '').strip()
-            anotacoes_culto = request.form.get('anotacoes_culto', '').strip()
-            devocional = request.form.get('devocional', '').strip()
-
-            # Validação dos dados
-            if not (data and tema and passagem_biblica and anotacoes_culto and devocional):
-                return "Todos os campos são obrigatórios!", 400
-
-            # Verificar formato da data (simples)
-            import re
-            if not re.match(r"\d{2}/\d{2}/\d{4}", data):
-                return "Formato de data inválido. Use DD/MM/AAAA.", 400
-
-            anotacao = {
-                "data": data,
-                "tema": tema,
-                "passagem_biblica": passagem_biblica,
-                "anotacoes_culto": anotacoes_culto,
-                "devocional": devocional
-            }
-
-            anotacoes[index] = anotacao
-            salvar_anotacoes(anotacoes)
-            return redirect(url_for('index'))
-        
-        anotacao = anotacoes[index]
-        return render_template('editar.html', index=index, anotacao=anotacao)
-    else:
+    return renderizar('adicionar.html')
+
+@app.route('/editar/<int:id_anotacao>', methods=['GET', 'POST'])
+def editar(id_anotacao):
+    anotacao = repositorio.obter(id_anotacao)
+    if anotacao is None:
         abort(404)
 
-@app.route('/deletar/<int:index>', methods=['POST'])
-def deletar(index):
-    anotacoes = carregar_anotacoes()
-    if 0 <= index < len(anotacoes):
-        anotacoes.pop(index)
-        salvar_anotacoes(anotacoes)
-        logging.info(f"Anotação no índice {index} deletada com sucesso.")
-    else:
-        logging.error(f"Índice {index} inválido para exclusão.")
+    if request.method == 'POST':
+        data = request.form.get('data', '').strip()
+        tema = request.form.get('tema', '').strip()
+        passagem_biblica = request.form.get('passagem_biblica', '').strip()
+        anotacoes_culto = request.form.get('anotacoes_culto', '').strip()
+        devocional = request.form.get('devocional', '').strip()
+
+        # Validação dos dados
+        if not (data and tema and passagem_biblica and anotacoes_culto and devocional):
+            return "Todos os campos são obrigatórios!", 400
+
+        # Verificar formato da data (simples)
+        import re
+        if not re.match(r"\d{2}/\d{2}/\d{4}", data):
+            return "Formato de data inválido. Use DD/MM/AAAA.", 400
+
+        anotacao = {
+            "data": data,
+            "tema": tema,
+            "passagem_biblica": passagem_biblica,
+            "anotacoes_culto": anotacoes_culto,
+            "devocional": devocional
+        }
+
+        # Pode ter sido removida por outro worker entre a leitura e a escrita
+        if alterar_anotacoes(repositorio.editar, id_anotacao, anotacao) is False:
+            abort(404)
+        return redirect(url_for('index'))
+
+    return renderizar('editar.html', id_anotacao=id_anotacao, anotacao=anotacao)
+
+@app.route('/deletar/<int:id_anotacao>', methods=['POST'])
+def deletar(id_anotacao):
+    if alterar_anotacoes(repositorio.remover, id_anotacao) is False:
+        logging.error(f"Anotação {id_anotacao} inexistente para exclusão.")
         abort(404)
+    logging.info(f"Anotação {id_anotacao} deletada com sucesso.")
     return redirect(url_for('index'))
 
 @app.route('/resumo')
 def resumo():
-    anotacoes = carregar_anotacoes()
-    temas = set()
-    passagens_biblicas = {}
-    semanas = set()
-
-    for anotacao in anotacoes:
-        temas.add(anotacao['tema'])
-        passagem = anotacao['passagem_biblica']
-        livro = passagem.split()[0]  # Assumindo o livro é a primeira palavra
-        if livro not in passagens_biblicas:
-            passagens_biblicas[livro] = []
-        passagens_biblicas[livro].append(passagem)
-        semanas.add(anotacao['data'])
-
-    return render_template('resumo.html', temas=list(temas), passagens_biblicas=passagens_biblicas, semanas=list(semanas))
+    return renderizar('resumo.html', resumo=agregados.resumo())
+
+# Mesmo resumo em JSON
+@app.route('/api/resumo')
+def api_resumo():
+    return jsonify(agregados.resumo())
+
+# Métricas no formato texto do Prometheus (deste worker)
+@app.route('/metrics')
+def metrics():
+    medidores = {
+        "repositorio": repositorio.estatisticas(),
+        "fila_upload": fila_upload.estado(),
+        "agregados": agregados.estatisticas(),
+    }
+    return Response(metricas.exportar(medidores), mimetype='text/plain; version=0.0.4')
+
+# Migrar para o armazenamento configurado (ex.: ARMAZENAMENTO=sqlite)
+@app.cli.command('migrar')
+@click.argument('arquivos', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--backups', 'incluir_backups', is_flag=True,
+              help='Incluir também os snapshots da pasta de backups (pode trazer de volta anotações excluídas).')
+def migrar(arquivos, incluir_backups):
+    """Importa anotações de arquivos JSON, sem duplicar as que já existem."""
+    arquivos = list(arquivos) or [ANOTACOES_FILE]
+    if incluir_backups and os.path.isdir(BACKUP_DIR):
+        # Cópias integrais antigas, anteriores ao catálogo de snapshots
+        arquivos += sorted(
+            os.path.join(BACKUP_DIR, nome) for nome in os.listdir(BACKUP_DIR) if nome.endswith('.json')
+            and nome != os.path.basename(gerenciador_backup.caminho_catalogo)
+        )
+    for arquivo in arquivos:
+        novas = repositorio.mesclar(ler_json_anotacoes(arquivo))
+        click.echo(f"{arquivo}: {novas} anotação(ões) nova(s).")
+    if incluir_backups:
+        for snapshot in gerenciador_backup.listar():
+            try:
+                anotacoes = gerenciador_backup.ler(snapshot)
+            except (IOError, EOFError, ValueError) as e:
+                click.echo(f"backup {snapshot['id']} ignorado: {e}", err=True)
+                continue
+            novas = repositorio.mesclar(anotacoes)
+            click.echo(f"backup {snapshot['id']}: {novas} anotação(ões) nova(s).")
+    fila_upload.agendar()
+
+# Administração dos backups: flask backups listar|criar|restaurar|verificar|podar|importar-legados
+@app.cli.group('backups')
+def backups():
+    """Backups deduplicados das anotações."""
+
+@backups.command('listar')
+def backups_listar():
+    """Lista os snapshots, do mais antigo ao mais recente."""
+    snapshots = gerenciador_backup.listar()
+    for snapshot in snapshots:
+        click.echo(
+            f"{snapshot['id']:<20} {snapshot['criado_em']}  {snapshot['anotacoes']:>5} anotações  "
+            f"{snapshot['tamanho']:>9} B ({snapshot['comprimido']} B gz)  {snapshot['sha256'][:12]}  {snapshot['origem']}"
+        )
+    click.echo(f"{len(snapshots)} snapshot(s).")
+
+@backups.command('criar')
+def backups_criar():
+    """Cria um snapshot agora, se o conteúdo mudou desde o último."""
+    snapshot = gerenciador_backup.criar(origem="manual")
+    click.echo(f"Snapshot {snapshot['id']} criado." if snapshot else "Nada mudou desde o último snapshot.")
+
+@backups.command('restaurar')
+@click.argument('id_snapshot', default='ultimo')
+@click.option('--destino', type=click.Path(dir_okay=False),
+              help='Gravar o snapshot neste arquivo em vez de substituir as anotações atuais.')
+def backups_restaurar(id_snapshot, destino):
+    """Restaura um snapshot (por id, ou "ultimo")."""
+    snapshot = gerenciador_backup.obter(id_snapshot)
+    if snapshot is None:
+        raise click.ClickException(f"Snapshot {id_snapshot} não encontrado.")
+    try:
+        anotacoes = gerenciador_backup.ler(snapshot)
+    except (IOError, EOFError, ValueError) as e:
+        # EOFError: objeto gzip truncado
+        raise click.ClickException(str(e))
+    if destino:
+        gravar_json_atomico(destino, anotacoes)
+        click.echo(f"Snapshot {snapshot['id']} gravado em {destino}.")
+        return
+    # O estado atual vira um snapshot antes de ser substituído
+    gerenciador_backup.criar(origem="antes-de-restaurar")
+    salvar_anotacoes(anotacoes)
+    click.echo(f"Snapshot {snapshot['id']} restaurado ({len(anotacoes)} anotações).")
+
+@backups.command('verificar')
+def backups_verificar():
+    """Confere a integridade (gzip, SHA-256 e JSON) de todos os snapshots."""
+    problemas = gerenciador_backup.verificar()
+    for problema in problemas:
+        click.echo(problema, err=True)
+    if problemas:
+        raise click.ClickException(f"{len(problemas)} problema(s) encontrado(s).")
+    click.echo("Todos os snapshots estão íntegros.")
+
+@backups.command('podar')
+def backups_podar():
+    """Aplica a política de retenção (BACKUP_RETER_HORAS/DIAS/SEMANAS)."""
+    removidos = gerenciador_backup.podar()
+    click.echo(f"{len(removidos)} snapshot(s) removido(s).")
+
+@backups.command('importar-legados')
+def backups_importar_legados():
+    """Traz para o catálogo as cópias antigas anotacoes_culto_backup_*.json (sem apagá-las)."""
+    importados, repetidos = gerenciador_backup.importar_legados()
+    click.echo(f"{importados} cópia(s) importada(s), {repetidos} repetida(s) ignorada(s).")
+    if importados:
+        click.echo("A retenção não foi aplicada; use 'flask backups podar' para aplicá-la.")
 
 @app.route('/sair')
 def sair():
-    return render_template('sair.html')
+    return renderizar('sair.html')
 
 if __name__ == '__main__':
     app.run(debug=True)
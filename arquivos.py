@@ -0,0 +1,69 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+# Gravar um arquivo JSON de forma atômica (arquivo temporário + fsync + rename).
+# Retorna o os.stat do arquivo gravado, que continua válido após o rename.
+def gravar_json_atomico(caminho, dados, indent=4):
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, caminho_temp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=diretorio)
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+            status = os.fstat(f.fileno())
+        os.replace(caminho_temp, caminho)
+    except BaseException:
+        if os.path.exists(caminho_temp):
+            os.remove(caminho_temp)
+        raise
+    return status
+
+
+# Assinatura barata de um arquivo: se mtime, tamanho e inode não mudaram,
+# o conteúdo já carregado em memória continua válido.
+def assinatura_arquivo(status):
+    return (status.st_mtime_ns, status.st_size, status.st_ino)
+
+
+# Gravar bytes em um temporário no mesmo diretório do destino, já com fsync.
+# O rename fica a cargo de quem chama, para permitir trocar dois arquivos juntos.
+def gravar_temporario(caminho_destino, conteudo):
+    diretorio = os.path.dirname(os.path.abspath(caminho_destino))
+    fd, caminho_temp = tempfile.mkstemp(prefix=".tmp_", dir=diretorio)
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(caminho_temp)
+        raise
+    return caminho_temp
+
+
+def sincronizar_diretorio(caminho):
+    fd = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Trava exclusiva entre processos (workers do gunicorn) sobre um arquivo. O
+# arquivo é aberto a cada uso para que a trava não seja compartilhada entre
+# processos após um fork.
+@contextmanager
+def travar_arquivo(caminho):
+    with open(caminho, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
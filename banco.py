@@ -0,0 +1,333 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from markupsafe import Markup, escape
+
+from busca import PESOS_CAMPOS, TAMANHO_MINIMO_PREFIXO, tokenizar
+from repositorio import CAMPOS, RepositorioBase, chave_conteudo, data_iso, extrair_livro, ler_json_anotacoes
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS anotacoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL,
+    data_iso TEXT,
+    tema TEXT NOT NULL,
+    passagem_biblica TEXT NOT NULL,
+    livro TEXT,
+    anotacoes_culto TEXT NOT NULL,
+    devocional TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_anotacoes_data_iso ON anotacoes (data_iso);
+CREATE INDEX IF NOT EXISTS idx_anotacoes_tema ON anotacoes (tema);
+CREATE INDEX IF NOT EXISTS idx_anotacoes_livro ON anotacoes (livro);
+
+-- Contador de transações de escrita (linha única), lido por versao()
+CREATE TABLE IF NOT EXISTS alteracoes (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    contador INTEGER NOT NULL
+);
+
+-- Índice de texto completo (sem acentos), mantido pelos gatilhos abaixo
+CREATE VIRTUAL TABLE IF NOT EXISTS anotacoes_fts USING fts5 (
+    tema, passagem_biblica, anotacoes_culto, devocional,
+    content='anotacoes', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS anotacoes_fts_inserir AFTER INSERT ON anotacoes BEGIN
+    INSERT INTO anotacoes_fts (rowid, tema, passagem_biblica, anotacoes_culto, devocional)
+    VALUES (new.id, new.tema, new.passagem_biblica, new.anotacoes_culto, new.devocional);
+END;
+CREATE TRIGGER IF NOT EXISTS anotacoes_fts_remover AFTER DELETE ON anotacoes BEGIN
+    INSERT INTO anotacoes_fts (anotacoes_fts, rowid, tema, passagem_biblica, anotacoes_culto, devocional)
+    VALUES ('delete', old.id, old.tema, old.passagem_biblica, old.anotacoes_culto, old.devocional);
+END;
+CREATE TRIGGER IF NOT EXISTS anotacoes_fts_atualizar AFTER UPDATE ON anotacoes BEGIN
+    INSERT INTO anotacoes_fts (anotacoes_fts, rowid, tema, passagem_biblica, anotacoes_culto, devocional)
+    VALUES ('delete', old.id, old.tema, old.passagem_biblica, old.anotacoes_culto, old.devocional);
+    INSERT INTO anotacoes_fts (rowid, tema, passagem_biblica, anotacoes_culto, devocional)
+    VALUES (new.id, new.tema, new.passagem_biblica, new.anotacoes_culto, new.devocional);
+END;
+"""
+
+# Versão do esquema, guardada em PRAGMA user_version
+# 1: importação inicial do JSON; 2: índice de texto completo;
+# 3: coluna livro recalculada com o analisador de referências; 4: contador de alterações
+VERSAO_ESQUEMA = 4
+
+# bm25 com os pesos das colunas de anotacoes_fts (mesma ordem da tabela)
+RANK_FTS = "bm25(%s)" % ", ".join(
+    str(PESOS_CAMPOS[campo]) for campo in ("tema", "passagem_biblica", "anotacoes_culto", "devocional")
+)
+
+# Marcadores do snippet(); o texto é escapado depois e eles viram <mark>
+INICIO_DESTAQUE, FIM_DESTAQUE = "\x02", "\x03"
+
+ORDENACAO_SQL = {
+    "data_desc": "data_iso DESC, id DESC",
+    "data_asc": "data_iso ASC, id ASC",
+    "id": "id",
+}
+
+
+def linha_para_anotacao(linha):
+    anotacao = {"id": linha["id"]}
+    for campo in CAMPOS:
+        anotacao[campo] = linha[campo]
+    return anotacao
+
+
+def valores_anotacao(anotacao):
+    return {
+        **{campo: anotacao.get(campo, "") for campo in CAMPOS},
+        "data_iso": data_iso(anotacao.get("data", "")),
+        "livro": extrair_livro(anotacao.get("passagem_biblica", "")),
+    }
+
+
+# Repositório em SQLite (modo WAL), com chave primária estável e índices por
+# data, tema e livro. Editar, remover ou consultar uma anotação não carrega a
+# coleção inteira. Uma conexão por thread e por processo (seguro após o fork
+# do gunicorn).
+class RepositorioSQLite(RepositorioBase):
+    def __init__(self, caminho, ao_faltar_arquivo=None):
+        super().__init__()
+        raiz, _ = os.path.splitext(caminho)
+        self.caminho_importacao = caminho
+        self.caminho_banco = raiz + ".db"
+        self.ao_faltar_arquivo = ao_faltar_arquivo
+        self._local = threading.local()
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is not None and self._local.pid == os.getpid():
+            return conexao
+        conexao = sqlite3.connect(self.caminho_banco, isolation_level=None, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexao.executescript(ESQUEMA)
+        self._local.conexao = conexao
+        self._local.pid = os.getpid()
+        self._local.data_version = None
+        self._migrar(conexao)
+        return conexao
+
+    @contextmanager
+    def _transacao(self):
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexao
+            conexao.execute("UPDATE alteracoes SET contador = contador + 1")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+        conexao.execute("COMMIT")
+
+    def _migrar(self, conexao):
+        # Só um worker migra: os demais esperam o BEGIN IMMEDIATE e já encontram a versão nova
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+            if versao < 1:
+                if not os.path.exists(self.caminho_importacao) and self.ao_faltar_arquivo is not None:
+                    self.ao_faltar_arquivo()
+                if os.path.exists(self.caminho_importacao):
+                    logging.info(f"Importando {self.caminho_importacao} para {self.caminho_banco}.")
+                    self._inserir(conexao, ler_json_anotacoes(self.caminho_importacao))
+            if 0 < versao < 2:
+                # Banco anterior ao índice de texto: indexar o que já existe
+                conexao.execute("INSERT INTO anotacoes_fts (anotacoes_fts) VALUES ('rebuild')")
+            if 0 < versao < 3:
+                # Livros antes eram só a primeira palavra ("1", "Jo"): recalcular pelo nome canônico
+                for linha in conexao.execute("SELECT id, passagem_biblica FROM anotacoes").fetchall():
+                    conexao.execute(
+                        "UPDATE anotacoes SET livro = ? WHERE id = ?",
+                        (extrair_livro(linha["passagem_biblica"]), linha["id"]),
+                    )
+            if versao < 4:
+                conexao.execute("INSERT OR IGNORE INTO alteracoes (id, contador) VALUES (1, 0)")
+            if versao < VERSAO_ESQUEMA:
+                conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+        conexao.execute("COMMIT")
+
+    # Outros workers (ou conexões) alteraram o banco? PRAGMA data_version muda
+    # a cada commit feito por outra conexão; os observadores são avisados.
+    def _revalidar(self):
+        conexao = self._conexao()
+        versao = conexao.execute("PRAGMA data_version").fetchone()[0]
+        if versao == self._local.data_version:
+            self.acertos += 1
+            return
+        self.falhas += 1
+        self._local.data_version = versao
+        self._notificar("recarregar")
+
+    # Contador gravado no banco a cada transação de escrita, de qualquer worker
+    def versao(self):
+        return self._conexao().execute("SELECT contador FROM alteracoes").fetchone()[0]
+
+    def _inserir(self, conexao, anotacoes):
+        for anotacao in anotacoes:
+            valores = valores_anotacao(anotacao)
+            valores["id"] = anotacao.get("id") if isinstance(anotacao.get("id"), int) else None
+            conexao.execute(
+                "INSERT OR REPLACE INTO anotacoes (id, data, data_iso, tema, passagem_biblica, livro, anotacoes_culto, devocional) "
+                "VALUES (:id, :data, :data_iso, :tema, :passagem_biblica, :livro, :anotacoes_culto, :devocional)",
+                valores,
+            )
+
+    def listar(self):
+        linhas = self._conexao().execute("SELECT * FROM anotacoes ORDER BY id").fetchall()
+        return [linha_para_anotacao(linha) for linha in linhas]
+
+    carregar = listar
+
+    def obter(self, id_anotacao):
+        linha = self._conexao().execute("SELECT * FROM anotacoes WHERE id = ?", (id_anotacao,)).fetchone()
+        return linha_para_anotacao(linha) if linha is not None else None
+
+    def _filtros_sql(self, tema=None, livro=None, data_inicio=None, data_fim=None, ordem="data_desc"):
+        condicoes, parametros = [], []
+        if tema:
+            condicoes.append("tema = ?")
+            parametros.append(tema)
+        if livro:
+            condicoes.append("livro = ?")
+            parametros.append(livro)
+        if data_inicio:
+            condicoes.append("data_iso >= ?")
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append("data_iso <= ?")
+            parametros.append(data_fim)
+        where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return where, parametros, ORDENACAO_SQL.get(ordem, ORDENACAO_SQL["data_desc"])
+
+    def consultar(self, limite=None, deslocamento=0, **filtros):
+        where, parametros, ordenacao = self._filtros_sql(**filtros)
+        conexao = self._conexao()
+        total = conexao.execute("SELECT COUNT(*) FROM anotacoes" + where, parametros).fetchone()[0]
+        sql = "SELECT * FROM anotacoes" + where + " ORDER BY " + ordenacao
+        if limite is not None:
+            sql += " LIMIT ? OFFSET ?"
+            parametros = parametros + [limite, deslocamento]
+        linhas = conexao.execute(sql, parametros).fetchall()
+        return [linha_para_anotacao(linha) for linha in linhas], total
+
+    def iterar(self, **filtros):
+        where, parametros, ordenacao = self._filtros_sql(**filtros)
+        cursor = self._conexao().execute("SELECT * FROM anotacoes" + where + " ORDER BY " + ordenacao, parametros)
+        while True:
+            linhas = cursor.fetchmany(200)
+            if not linhas:
+                break
+            for linha in linhas:
+                yield linha_para_anotacao(linha)
+
+    # Inserir uma anotação nova; o id vem do AUTOINCREMENT, que nunca reaproveita ids
+    def _inserir_nova(self, conexao, anotacao):
+        return conexao.execute(
+            "INSERT INTO anotacoes (data, data_iso, tema, passagem_biblica, livro, anotacoes_culto, devocional) "
+            "VALUES (:data, :data_iso, :tema, :passagem_biblica, :livro, :anotacoes_culto, :devocional)",
+            valores_anotacao(anotacao),
+        ).lastrowid
+
+    def adicionar(self, anotacao):
+        with self._lock:
+            with self._transacao() as conexao:
+                id_anotacao = self._inserir_nova(conexao, anotacao)
+            self._notificar("adicionar", dict(anotacao, id=id_anotacao))
+            return id_anotacao
+
+    def editar(self, id_anotacao, anotacao):
+        with self._lock:
+            with self._transacao() as conexao:
+                cursor = conexao.execute(
+                    "UPDATE anotacoes SET data = :data, data_iso = :data_iso, tema = :tema, "
+                    "passagem_biblica = :passagem_biblica, livro = :livro, "
+                    "anotacoes_culto = :anotacoes_culto, devocional = :devocional WHERE id = :id",
+                    dict(valores_anotacao(anotacao), id=id_anotacao),
+                )
+            if cursor.rowcount == 0:
+                return False
+            self._notificar("editar", dict(anotacao, id=id_anotacao))
+            return True
+
+    def remover(self, id_anotacao):
+        with self._lock:
+            with self._transacao() as conexao:
+                cursor = conexao.execute("DELETE FROM anotacoes WHERE id = ?", (id_anotacao,))
+            if cursor.rowcount == 0:
+                return False
+            self._notificar("remover", id_anotacao)
+            return True
+
+    def importar(self, anotacoes):
+        with self._lock:
+            with self._transacao() as conexao:
+                conexao.execute("DELETE FROM anotacoes")
+                self._inserir(conexao, anotacoes)
+            self._notificar("recarregar")
+
+    # A comparação com o conteúdo existente e as inserções acontecem na mesma
+    # transação; cada anotação nova é notificada como um "adicionar".
+    def mesclar(self, anotacoes):
+        with self._lock:
+            with self._transacao() as conexao:
+                existentes = {
+                    tuple(linha[campo] for campo in CAMPOS)
+                    for linha in conexao.execute("SELECT * FROM anotacoes")
+                }
+                novas = []
+                for anotacao in anotacoes:
+                    chave = chave_conteudo(anotacao)
+                    if chave not in existentes:
+                        existentes.add(chave)
+                        nova = {campo: anotacao.get(campo, "") for campo in CAMPOS}
+                        nova["id"] = self._inserir_nova(conexao, nova)
+                        novas.append(nova)
+            for anotacao in novas:
+                self._notificar("adicionar", anotacao)
+            return len(novas)
+
+    # Busca no FTS5: todos os termos obrigatórios, prefixo a partir de
+    # TAMANHO_MINIMO_PREFIXO letras, ranking bm25 e trecho destacado.
+    def buscar(self, consulta, limite=20):
+        termos = [
+            f'"{termo}"*' if len(termo) >= TAMANHO_MINIMO_PREFIXO else f'"{termo}"'
+            for termo in tokenizar(consulta)
+        ]
+        if not termos:
+            return []
+        # "rank MATCH" configura o bm25 com pesos no próprio FTS5, que então
+        # ordena e corta o LIMIT sem calcular trechos para todos os resultados
+        linhas = self._conexao().execute(
+            "SELECT a.*, f.rank AS pontuacao, snippet(anotacoes_fts, -1, ?, ?, '…', 12) AS trecho "
+            "FROM anotacoes_fts f JOIN anotacoes a ON a.id = f.rowid "
+            "WHERE anotacoes_fts MATCH ? AND f.rank MATCH ? ORDER BY f.rank LIMIT ?",
+            (INICIO_DESTAQUE, FIM_DESTAQUE, " ".join(termos), RANK_FTS, limite),
+        ).fetchall()
+        return [
+            {
+                "anotacao": linha_para_anotacao(linha),
+                # bm25() do SQLite é negativo: quanto menor, melhor
+                "pontuacao": -linha["pontuacao"],
+                "trecho": Markup(
+                    str(escape(linha["trecho"]))
+                    .replace(INICIO_DESTAQUE, "<mark>")
+                    .replace(FIM_DESTAQUE, "</mark>")
+                ),
+            }
+            for linha in linhas
+        ]
+
+    def estatisticas(self):
+        total = self._conexao().execute("SELECT COUNT(*) FROM anotacoes").fetchone()[0]
+        return {"anotacoes": total}
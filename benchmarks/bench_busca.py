@@ -0,0 +1,112 @@
+"""Benchmark da busca textual sobre um corpus sintético de anotações.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/bench_busca.py --anotacoes 20000 --consultas 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banco import RepositorioSQLite  # noqa: E402
+from busca import IndiceBusca  # noqa: E402
+
+# Palavras "de tema", frequentes no corpus e usadas nas consultas
+PALAVRAS_TEMA = """
+graça fé esperança amor perdão salvação oração louvor adoração igreja
+comunhão santidade obediência misericórdia justiça verdade vida luz
+caminho palavra espírito reino glória paz alegria sabedoria humildade
+arrependimento redenção promessa aliança cruz ressurreição servir
+família irmãos jovens missão evangelho discípulo coração confiança
+""".split()
+TEMAS = ["Fé", "Graça", "Família", "Missões", "Oração", "Santidade", "Esperança", "Louvor"]
+LIVROS = ["Gênesis", "Salmos", "Provérbios", "Isaías", "Mateus", "João", "Romanos", "1 Coríntios", "Efésios", "Apocalipse"]
+SILABAS = ["ba", "be", "ca", "ço", "da", "de", "fa", "ga", "lu", "ma", "mi", "na", "no", "pa", "ra", "re", "sa", "ta", "te", "vi"]
+
+
+# Vocabulário sintético com frequência aproximadamente de Zipf, como em texto real.
+# As palavras de tema ficam em posições intermediárias (nem raras, nem onipresentes).
+def gerar_vocabulario(gerador, tamanho=5000):
+    palavras = sorted({"".join(gerador.choice(SILABAS) for _ in range(gerador.randint(2, 4))) for _ in range(tamanho)})
+    vocabulario = palavras[:50] + PALAVRAS_TEMA + palavras[50:]
+    pesos = [1 / posicao for posicao in range(1, len(vocabulario) + 1)]
+    return vocabulario, pesos
+
+
+def texto_aleatorio(gerador, vocabulario, pesos, palavras):
+    return " ".join(gerador.choices(vocabulario, pesos, k=palavras)).capitalize() + "."
+
+
+def gerar_anotacoes(quantidade, semente=42):
+    gerador = random.Random(semente)
+    vocabulario, pesos = gerar_vocabulario(gerador)
+    return [
+        {
+            "id": i,
+            "data": f"{gerador.randint(1, 28):02d}/{gerador.randint(1, 12):02d}/{gerador.randint(2000, 2024)}",
+            "tema": gerador.choice(TEMAS),
+            "passagem_biblica": f"{gerador.choice(LIVROS)} {gerador.randint(1, 30)}:{gerador.randint(1, 20)}",
+            "anotacoes_culto": texto_aleatorio(gerador, vocabulario, pesos, gerador.randint(40, 200)),
+            "devocional": texto_aleatorio(gerador, vocabulario, pesos, gerador.randint(20, 80)),
+        }
+        for i in range(1, quantidade + 1)
+    ]
+
+
+def gerar_consultas(quantidade, semente=7):
+    gerador = random.Random(semente)
+    consultas = []
+    for _ in range(quantidade):
+        termos = gerador.sample(PALAVRAS_TEMA, gerador.randint(1, 3))
+        # Parte das consultas usa só o prefixo do último termo
+        if gerador.random() < 0.3:
+            termos[-1] = termos[-1][:4]
+        consultas.append(" ".join(termos))
+    return consultas
+
+
+def medir(nome, buscar, consultas):
+    tempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        buscar(consulta)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"{nome:<10} média {statistics.mean(tempos):7.2f} ms   p50 {statistics.median(tempos):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   máx {tempos[-1]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--anotacoes", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--limite", type=int, default=20)
+    args = parser.parse_args()
+
+    anotacoes = gerar_anotacoes(args.anotacoes)
+    consultas = gerar_consultas(args.consultas)
+    print(f"{args.anotacoes} anotações sintéticas, {args.consultas} consultas, limite {args.limite}")
+
+    inicio = time.perf_counter()
+    indice = IndiceBusca()
+    indice.reconstruir(anotacoes)
+    print(f"memória: índice construído em {time.perf_counter() - inicio:.2f} s")
+    medir("memória", lambda consulta: indice.buscar(consulta, args.limite), consultas)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        repositorio = RepositorioSQLite(os.path.join(diretorio, "anotacoes.json"))
+        inicio = time.perf_counter()
+        repositorio.importar(anotacoes)
+        print(f"sqlite: importação + FTS5 em {time.perf_counter() - inicio:.2f} s")
+        medir("sqlite", lambda consulta: repositorio.buscar(consulta, args.limite), consultas)
+
+
+if __name__ == "__main__":
+    main()
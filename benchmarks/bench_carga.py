@@ -0,0 +1,168 @@
+"""Benchmark de carga das rotas do app com o Dropbox simulado.
+
+Gera N anotações sintéticas em um diretório temporário, importa o app com
+DROPBOX_FAKE_DIR (cliente local no lugar do Dropbox) e sincronização em
+segundo plano desativada, e dispara uma mistura de requisições pelo test
+client do Flask. Ao final mostra vazão e latência por rota e as fases
+medidas (load/parse/sync/render/save) a partir do registro de métricas.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/bench_carga.py --anotacoes 2000 --requisicoes 2000 --armazenamento sqlite
+    python benchmarks/bench_carga.py --saida resultado.json   # para comparar execuções
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_busca import gerar_anotacoes, gerar_consultas  # noqa: E402
+
+# Peso de cada tipo de requisição na mistura (leituras dominam, como no uso real)
+MISTURA = {
+    "listar": 30,
+    "filtrar": 10,
+    "buscar": 20,
+    "resumo": 10,
+    "api_resumo": 5,
+    "editar_form": 5,
+    "exportar": 2,
+    "adicionar": 8,
+    "editar": 7,
+    "deletar": 3,
+}
+
+
+def percentil(tempos, fracao):
+    return tempos[min(int(len(tempos) * fracao), len(tempos) - 1)]
+
+
+def formulario(anotacao):
+    return {campo: anotacao[campo] for campo in ("data", "tema", "passagem_biblica", "anotacoes_culto", "devocional")}
+
+
+def executar(cliente, gerador, modelos, consultas, ids, tipo):
+    if tipo == "listar":
+        return cliente.get(f"/?pagina={gerador.randint(1, 5)}")
+    if tipo == "filtrar":
+        return cliente.get(f"/?tema={gerador.choice(modelos)['tema']}&ordem=data_asc")
+    if tipo == "buscar":
+        return cliente.get("/buscar", query_string={"q": gerador.choice(consultas)})
+    if tipo == "resumo":
+        return cliente.get("/resumo")
+    if tipo == "api_resumo":
+        return cliente.get("/api/resumo")
+    if tipo == "editar_form":
+        return cliente.get(f"/editar/{gerador.choice(ids)}")
+    if tipo == "exportar":
+        return cliente.get(f"/exportar?tema={gerador.choice(modelos)['tema']}")
+    if tipo == "adicionar":
+        return cliente.post("/adicionar", data=formulario(gerador.choice(modelos)))
+    if tipo == "editar":
+        return cliente.post(f"/editar/{gerador.choice(ids)}", data=formulario(gerador.choice(modelos)))
+    if tipo == "deletar":
+        return cliente.post(f"/deletar/{ids.pop(gerador.randrange(len(ids)))}")
+    raise ValueError(tipo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--anotacoes", type=int, default=2000)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--armazenamento", choices=("json", "diario", "sqlite"), default="json")
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--saida", help="Gravar o resultado em JSON neste arquivo.")
+    args = parser.parse_args()
+    saida = os.path.abspath(args.saida) if args.saida else None
+
+    diretorio = tempfile.mkdtemp(prefix="bench_carga_")
+    os.makedirs(os.path.join(diretorio, "dropbox"))
+    modelos = gerar_anotacoes(args.anotacoes)
+    with open(os.path.join(diretorio, "anotacoes_culto.json"), "w", encoding="utf-8") as f:
+        json.dump([{k: v for k, v in a.items() if k != "id"} for a in modelos], f, ensure_ascii=False, indent=4)
+
+    # O app usa caminhos relativos e lê a configuração do ambiente ao ser importado
+    os.environ.update({
+        "DROPBOX_FAKE_DIR": os.path.join(diretorio, "dropbox"),
+        "DROPBOX_SYNC_INTERVAL": "0",
+        "ARMAZENAMENTO": args.armazenamento,
+    })
+    os.environ.pop("METRICAS_LOG", None)
+    os.chdir(diretorio)
+    import logging
+    logging.disable(logging.INFO)
+    import app as aplicacao
+
+    cliente = aplicacao.app.test_client()
+    gerador = random.Random(args.semente)
+    consultas = gerar_consultas(200)
+    ids = list(range(1, args.anotacoes + 1))
+    tipos = gerador.choices(list(MISTURA), list(MISTURA.values()), k=args.requisicoes)
+
+    # Aquecimento: primeira carga do repositório, índice de busca e agregados
+    for rota in ("/", "/buscar?q=graça", "/resumo"):
+        cliente.get(rota).close()
+
+    tempos = defaultdict(list)
+    inicio_total = time.perf_counter()
+    for tipo in tipos:
+        inicio = time.perf_counter()
+        resposta = executar(cliente, gerador, modelos, consultas, ids, tipo)
+        resposta.get_data()
+        resposta.close()
+        tempos[tipo].append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code >= 400:
+            print(f"{tipo}: status {resposta.status_code}", file=sys.stderr)
+    duracao_total = time.perf_counter() - inicio_total
+    aplicacao.fila_upload.descarregar()
+
+    print(f"{args.anotacoes} anotações, {args.requisicoes} requisições, armazenamento {args.armazenamento} ({diretorio})")
+    print(f"total {duracao_total:.2f} s, {args.requisicoes / duracao_total:.0f} req/s")
+    resultado = {"anotacoes": args.anotacoes, "requisicoes": args.requisicoes,
+                 "armazenamento": args.armazenamento, "req_por_segundo": args.requisicoes / duracao_total,
+                 "rotas": {}, "fases": {}}
+    for tipo in MISTURA:
+        amostras = sorted(tempos.get(tipo, []))
+        if not amostras:
+            continue
+        resultado["rotas"][tipo] = {
+            "quantidade": len(amostras),
+            "media_ms": statistics.mean(amostras),
+            "p50_ms": percentil(amostras, 0.50),
+            "p95_ms": percentil(amostras, 0.95),
+            "max_ms": amostras[-1],
+        }
+        print(f"{tipo:<12} n={len(amostras):<5} média {statistics.mean(amostras):7.2f} ms   "
+              f"p50 {percentil(amostras, 0.50):7.2f} ms   p95 {percentil(amostras, 0.95):7.2f} ms   "
+              f"máx {amostras[-1]:7.2f} ms")
+
+    # Fases e chamadas ao Dropbox, lidas do próprio /metrics
+    print("fases:")
+    for linha in cliente.get("/metrics").get_data(as_text=True).splitlines():
+        for sufixo in ("_sum", "_count"):
+            prefixo = "anotacoes_fase_segundos" + sufixo + '{fase="'
+            if linha.startswith(prefixo):
+                fase, valor = linha[len(prefixo):].split('"} ')
+                resultado["fases"].setdefault(fase, {})[sufixo[1:]] = float(valor)
+        if linha.startswith("anotacoes_chamadas_externas_total"):
+            print(f"  {linha}")
+    for fase, valores in sorted(resultado["fases"].items()):
+        print(f"  {fase:<8} n={int(valores['count']):<6} total {valores['sum'] * 1000:9.1f} ms   "
+              f"média {valores['sum'] * 1000 / valores['count']:7.3f} ms")
+
+    if saida:
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import bisect
+import functools
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from markupsafe import Markup, escape
+
+# Campos indexados e o peso de cada um no ranking
+PESOS_CAMPOS = {
+    "tema": 3.0,
+    "passagem_biblica": 2.0,
+    "anotacoes_culto": 1.0,
+    "devocional": 1.0,
+}
+# Campos usados para montar o trecho destacado do resultado
+CAMPOS_TRECHO = ("anotacoes_culto", "devocional", "tema")
+
+# Termos a partir deste tamanho também casam por prefixo ("grac" -> "graca")
+TAMANHO_MINIMO_PREFIXO = 3
+MAXIMO_EXPANSOES_PREFIXO = 64
+
+# Palavras muito comuns em português, ignoradas na indexação (já sem acentos)
+STOPWORDS = frozenset("""
+a ao aos as com da das de do dos e em era essa esse isso esta este foi ha
+isto ja la lhe mais mas me meu minha na nas nao no nos o os ou para pela
+pelas pelo pelos por que se sem ser seu sua tem um uma umas uns
+""".split())
+
+PADRAO_PALAVRA = re.compile(r"\w+")
+
+# Parâmetros do BM25
+K1 = 1.2
+B = 0.75
+
+
+# Tabela de tradução preenchida sob demanda: cada caractere é decomposto
+# (NFKD) uma única vez e depois str.translate faz o trabalho em C
+class _TabelaSemAcentos(dict):
+    def __missing__(self, codigo):
+        decomposto = unicodedata.normalize("NFKD", chr(codigo))
+        self[codigo] = "".join(c for c in decomposto if not unicodedata.combining(c))
+        return self[codigo]
+
+
+_SEM_ACENTOS = _TabelaSemAcentos()
+
+
+# Minúsculas e sem acentos: "Graça" e "graca" viram o mesmo termo
+def normalizar(texto):
+    return texto.lower().translate(_SEM_ACENTOS)
+
+
+def tokenizar(texto):
+    return [
+        termo for termo in PADRAO_PALAVRA.findall(normalizar(texto or ""))
+        if termo not in STOPWORDS
+    ]
+
+
+# Expressão que acha qualquer um dos termos como palavra inteira no texto normalizado
+@functools.lru_cache(maxsize=256)
+def _padrao_termos(termos):
+    return re.compile(r"\b(?:%s)\b" % "|".join(re.escape(t) for t in sorted(termos, key=len, reverse=True)))
+
+
+# Trecho de um texto em torno da primeira ocorrência de um dos termos
+# (já normalizados), com as palavras encontradas entre <mark>. O texto
+# original é escapado.
+def montar_trecho(texto, termos, palavras_em_volta=12):
+    texto = texto or ""
+    termos = frozenset(termos)
+    if not termos:
+        return None
+    normalizado = normalizar(texto)
+    metade = palavras_em_volta // 2
+    if len(normalizado) != len(texto):
+        # Raro (ex.: ligaduras): as posições não batem, normaliza palavra a palavra
+        palavras = [(p.start(), p.end(), normalizar(p.group())) for p in PADRAO_PALAVRA.finditer(texto)]
+        primeira = next((i for i, (_, _, forma) in enumerate(palavras) if forma in termos), None)
+        if primeira is None:
+            return None
+        inicio = max(primeira - metade, 0)
+    else:
+        # Posições do texto normalizado valem para o original; a primeira ocorrência
+        # é achada pela expressão e só as palavras em volta dela são percorridas
+        ocorrencia = _padrao_termos(termos).search(normalizado)
+        if ocorrencia is None:
+            return None
+        anteriores = list(PADRAO_PALAVRA.finditer(normalizado, 0, ocorrencia.start()))
+        inicio = max(len(anteriores) - metade, 0)
+        palavras = [None] * inicio
+        for p in PADRAO_PALAVRA.finditer(normalizado, anteriores[inicio - 1].end() if inicio else 0):
+            palavras.append((p.start(), p.end(), p.group()))
+            if len(palavras) > inicio + palavras_em_volta:
+                break
+    fim = min(inicio + palavras_em_volta, len(palavras))
+
+    # O texto entre as palavras destacadas é escapado de uma vez
+    partes = ["…" if inicio > 0 else ""]
+    cursor = palavras[inicio][0]
+    for comeco, final, forma in palavras[inicio:fim]:
+        if forma in termos:
+            partes.append(escape(texto[cursor:comeco]))
+            partes.append(Markup("<mark>%s</mark>") % texto[comeco:final])
+            cursor = final
+    if fim < len(palavras):
+        partes += [escape(texto[cursor:palavras[fim - 1][1]]), "…"]
+    else:
+        partes.append(escape(texto[cursor:]))
+    return Markup("").join(partes)
+
+
+# Índice invertido em memória, atualizado a cada escrita do repositório.
+# Para cada termo guarda {id: frequência ponderada pelos pesos dos campos};
+# a lista ordenada de termos permite expandir prefixos com bisect.
+class IndiceBusca:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._termos = []
+        self._documentos = {}
+        self._tamanho_total = 0
+        self._normas = {}
+        self._media_normas = None
+
+    def _termos_documento(self, anotacao):
+        frequencias = {}
+        for campo, peso in PESOS_CAMPOS.items():
+            # Conta todas as palavras e só depois descarta as stopwords (bem menos chaves que palavras)
+            for termo, quantidade in Counter(PADRAO_PALAVRA.findall(normalizar(anotacao.get(campo) or ""))).items():
+                if termo not in STOPWORDS:
+                    frequencias[termo] = frequencias.get(termo, 0.0) + quantidade * peso
+        return frequencias
+
+    def adicionar(self, anotacao, ordenar=True):
+        with self._lock:
+            self.remover(anotacao["id"])
+            frequencias = self._termos_documento(anotacao)
+            tamanho = sum(frequencias.values())
+            for termo, frequencia in frequencias.items():
+                postings = self._postings.get(termo)
+                if postings is None:
+                    postings = self._postings[termo] = {}
+                    if ordenar:
+                        bisect.insort(self._termos, termo)
+                postings[anotacao["id"]] = frequencia
+            self._documentos[anotacao["id"]] = (anotacao, tamanho, tuple(frequencias))
+            self._tamanho_total += tamanho
+            if self._media_normas is not None:
+                self._normas[anotacao["id"]] = K1 * (1 - B + B * tamanho / self._media_normas)
+
+    def remover(self, id_anotacao):
+        with self._lock:
+            documento = self._documentos.pop(id_anotacao, None)
+            if documento is None:
+                return
+            _, tamanho, termos = documento
+            self._tamanho_total -= tamanho
+            self._normas.pop(id_anotacao, None)
+            for termo in termos:
+                postings = self._postings[termo]
+                del postings[id_anotacao]
+                if not postings:
+                    del self._postings[termo]
+                    del self._termos[bisect.bisect_left(self._termos, termo)]
+
+    def reconstruir(self, anotacoes):
+        with self._lock:
+            self._postings = {}
+            self._termos = []
+            self._documentos = {}
+            self._tamanho_total = 0
+            self._normas = {}
+            self._media_normas = None
+            for anotacao in anotacoes:
+                self.adicionar(anotacao, ordenar=False)
+            # Ordenar os termos uma vez só, em vez de um insort por termo novo
+            self._termos = sorted(self._postings)
+
+    def estatisticas(self):
+        with self._lock:
+            return {"indice_documentos": len(self._documentos), "indice_termos": len(self._termos)}
+
+    def _expandir(self, termo):
+        if len(termo) < TAMANHO_MINIMO_PREFIXO:
+            return [termo] if termo in self._postings else []
+        inicio = bisect.bisect_left(self._termos, termo)
+        expansoes = []
+        for termo_indice in self._termos[inicio:inicio + MAXIMO_EXPANSOES_PREFIXO]:
+            if not termo_indice.startswith(termo):
+                break
+            expansoes.append(termo_indice)
+        return expansoes
+
+    # Normalização de tamanho do BM25 por documento, K1 * (1 - B + B * tamanho / média).
+    # Só é recalculada quando o tamanho médio se afasta mais de 10% do usado no cálculo.
+    def _normalizacoes(self):
+        media = self._tamanho_total / len(self._documentos)
+        if self._media_normas is None or abs(media - self._media_normas) > 0.1 * self._media_normas:
+            self._normas = {}
+            self._media_normas = media
+        if len(self._normas) != len(self._documentos):
+            for id_anotacao, (_, tamanho, _) in self._documentos.items():
+                if id_anotacao not in self._normas:
+                    self._normas[id_anotacao] = K1 * (1 - B + B * tamanho / self._media_normas)
+        return self._normas
+
+    # Busca com todos os termos obrigatórios (E), ranqueada por BM25.
+    # Os termos são intersectados do mais raro para o mais comum e só os
+    # documentos que restam são pontuados.
+    # Devolve [{"anotacao", "pontuacao", "trecho"}] dos melhores resultados.
+    def buscar(self, consulta, limite=20):
+        termos_consulta = tokenizar(consulta)
+        if not termos_consulta:
+            return []
+        with self._lock:
+            total_documentos = len(self._documentos)
+            if not total_documentos:
+                return []
+            grupos = [self._expandir(termo) for termo in termos_consulta]
+            if not all(grupos):
+                return []
+            grupos.sort(key=lambda expansoes: sum(len(self._postings[t]) for t in expansoes))
+
+            candidatos = None
+            for expansoes in grupos:
+                ids = set().union(*(self._postings[t].keys() for t in expansoes))
+                candidatos = ids if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+
+            normas = self._normalizacoes()
+            pontuacoes = dict.fromkeys(candidatos, 0.0)
+            encontrados = set()
+            for expansoes in grupos:
+                for termo in expansoes:
+                    encontrados.add(termo)
+                    postings = self._postings[termo]
+                    peso = math.log(1 + (total_documentos - len(postings) + 0.5) / (len(postings) + 0.5)) * (K1 + 1)
+                    # Percorre o menor dos dois: candidatos ou documentos do termo
+                    if len(postings) > len(pontuacoes):
+                        for id_anotacao in pontuacoes:
+                            frequencia = postings.get(id_anotacao)
+                            if frequencia is not None:
+                                pontuacoes[id_anotacao] += peso * frequencia / (frequencia + normas[id_anotacao])
+                    else:
+                        for id_anotacao, frequencia in postings.items():
+                            if id_anotacao in pontuacoes:
+                                pontuacoes[id_anotacao] += peso * frequencia / (frequencia + normas[id_anotacao])
+
+            # Maior pontuação primeiro; empate pelo menor id
+            melhores = heapq.nsmallest(limite, ((-pontuacao, i) for i, pontuacao in pontuacoes.items()))
+            anotacoes = [(self._documentos[id_anotacao][0], -negativa) for negativa, id_anotacao in melhores]
+
+        resultados = []
+        for anotacao, pontuacao in anotacoes:
+            trecho = None
+            for campo in CAMPOS_TRECHO:
+                trecho = montar_trecho(anotacao.get(campo), encontrados)
+                if trecho:
+                    break
+            resultados.append({"anotacao": anotacao, "pontuacao": pontuacao, "trecho": trecho})
+        return resultados
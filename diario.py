@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import threading
+
+from arquivos import gravar_temporario, sincronizar_diretorio, travar_arquivo
+from metricas import medir
+from repositorio import RepositorioBase, indexar_anotacoes, ler_json_anotacoes
+
+
+# Primeira linha do diário: a geração (número da compactação) que o criou, a
+# mesma gravada no snapshot. O inode sozinho não identifica o diário: depois
+# de um os.replace o número pode ser reaproveitado pelo arquivo seguinte.
+def cabecalho_diario(geracao):
+    return (json.dumps({"geracao": geracao}) + "\n").encode("utf-8")
+
+
+# Ler o cabeçalho de um diário aberto no início; devolve (geração, bytes do
+# cabeçalho). Diários antigos, sem cabeçalho, são a geração 0.
+def ler_cabecalho(f):
+    linha = f.readline()
+    try:
+        return json.loads(linha)["geracao"], len(linha)
+    except (ValueError, KeyError, TypeError):
+        return 0, 0
+
+
+# Repositório em diário (journal) só de acréscimo.
+# Cada escrita anexa uma linha JSON ({"op", "id", "anotacao"}) ao arquivo
+# .diario.jsonl; na inicialização o snapshot é carregado e o diário reaplicado.
+# Periodicamente, em segundo plano, o estado é compactado em um novo snapshot,
+# e snapshot e diário novos levam o número da nova geração.
+#
+# As operações são idempotentes (adicionar/editar gravam o valor final, remover
+# apaga se existir), então reaplicar um diário antigo sobre um snapshot mais
+# novo, caso o processo caia no meio da compactação, dá o mesmo resultado.
+class RepositorioDiario(RepositorioBase):
+    def __init__(self, caminho, ao_faltar_arquivo=None, limite_compactacao=500, fsync=True):
+        super().__init__()
+        raiz, _ = os.path.splitext(caminho)
+        self.caminho_importacao = caminho
+        self.caminho_snapshot = raiz + ".snapshot.json"
+        self.caminho_diario = raiz + ".diario.jsonl"
+        self.caminho_trava = raiz + ".lock"
+        self.ao_faltar_arquivo = ao_faltar_arquivo
+        self.limite_compactacao = limite_compactacao
+        self.fsync = fsync
+        self.compactacoes = 0
+        self._proximo_id = 1
+        self._inode = None
+        self._geracao = 0
+        self._geracao_snapshot = 0
+        self._posicao = 0
+        self._operacoes = 0
+        self._compactando = False
+
+    # Trava entre processos (workers do gunicorn)
+    def _travado(self):
+        return travar_arquivo(self.caminho_trava)
+
+    def _aplicar(self, operacao, notificar=True):
+        id_anotacao = operacao["id"]
+        if operacao["op"] == "remover":
+            existia = self._anotacoes.pop(id_anotacao, None) is not None
+            evento, dados = ("remover", id_anotacao) if existia else (None, None)
+        else:
+            evento = "editar" if id_anotacao in self._anotacoes else "adicionar"
+            self._anotacoes[id_anotacao] = dados = operacao["anotacao"]
+        self._proximo_id = max(self._proximo_id, id_anotacao + 1)
+        self._operacoes += 1
+        if notificar and evento:
+            self._notificar(evento, dados)
+
+    # Aplicar as linhas completas de um trecho do diário; devolve os bytes consumidos.
+    # Uma última linha sem "\n" (gravação interrompida) é ignorada.
+    def _processar(self, dados, notificar=True):
+        fim = dados.rfind(b"\n") + 1
+        for linha in dados[:fim].splitlines():
+            if not linha.strip():
+                continue
+            try:
+                self._aplicar(json.loads(linha), notificar)
+            except (ValueError, KeyError, TypeError) as e:
+                logging.error(f"Linha inválida no diário {self.caminho_diario}: {e}")
+        return fim
+
+    def _importar_inicial(self):
+        if not os.path.exists(self.caminho_importacao) and self.ao_faltar_arquivo is not None:
+            self.ao_faltar_arquivo()
+        anotacoes = []
+        if os.path.exists(self.caminho_importacao):
+            logging.info(f"Importando {self.caminho_importacao} para o diário.")
+            anotacoes = ler_json_anotacoes(self.caminho_importacao)
+        self._substituir(anotacoes)
+
+    def _recarregar(self):
+        # Recarga completa (snapshot + diário inteiro); exige a trava entre processos
+        if not os.path.exists(self.caminho_snapshot) and not os.path.exists(self.caminho_diario):
+            self._importar_inicial()
+            return
+        with medir("load"):
+            anteriores = self._anotacoes
+            self._anotacoes = {}
+            self._proximo_id = 1
+            self._geracao_snapshot = 0
+            if os.path.exists(self.caminho_snapshot):
+                with medir("parse"), open(self.caminho_snapshot, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                self._anotacoes = {a["id"]: a for a in snapshot["anotacoes"]}
+                self._proximo_id = snapshot["proximo_id"]
+                self._geracao_snapshot = snapshot.get("geracao", 0)
+            self._operacoes = 0
+            with open(self.caminho_diario, "a+b") as f:
+                f.seek(0)
+                self._geracao, inicio = ler_cabecalho(f)
+                if os.fstat(f.fileno()).st_size == 0:
+                    # Diário ausente (só havia o snapshot): começa em uma geração nova
+                    self._geracao = self._proxima_geracao()
+                    f.write(cabecalho_diario(self._geracao))
+                    f.flush()
+                    inicio = f.tell()
+                self._inode = os.fstat(f.fileno()).st_ino
+                f.seek(inicio)
+                self._posicao = inicio + self._processar(f.read(), notificar=False)
+            self._notificar_diferencas(anteriores)
+
+    def _proxima_geracao(self):
+        return max(self._geracao, self._geracao_snapshot) + 1
+
+    def _revalidar(self, travado=False):
+        if self._anotacoes is not None:
+            try:
+                with open(self.caminho_diario, "rb") as f:
+                    status = os.fstat(f.fileno())
+                    if status.st_ino == self._inode and ler_cabecalho(f)[0] == self._geracao:
+                        if status.st_size == self._posicao:
+                            self.acertos += 1
+                            return
+                        # Outro worker anexou operações: reaplicar só a cauda
+                        f.seek(self._posicao)
+                        self._posicao += self._processar(f.read())
+                        self.falhas += 1
+                        return
+            except FileNotFoundError:
+                pass
+
+        self.falhas += 1
+        if travado:
+            self._recarregar()
+        else:
+            with self._travado():
+                self._recarregar()
+
+    # Geração e tamanho do diário: mudam a cada escrita, de qualquer worker
+    def versao(self):
+        try:
+            with open(self.caminho_diario, "rb") as f:
+                return ler_cabecalho(f)[0], os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return None
+
+    def _anexar(self, operacao):
+        with self._travado():
+            self._revalidar(travado=True)
+            if operacao["op"] != "adicionar" and operacao["id"] not in self._anotacoes:
+                return False
+            if operacao["op"] == "adicionar":
+                operacao["id"] = self._proximo_id
+                operacao["anotacao"]["id"] = self._proximo_id
+            with open(self.caminho_diario, "ab") as f:
+                # Descartar restos de uma gravação interrompida antes de anexar
+                if os.fstat(f.fileno()).st_size != self._posicao:
+                    f.truncate(self._posicao)
+                linha = (json.dumps(operacao, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(linha)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._posicao += len(linha)
+            self._aplicar(operacao)
+        if self._operacoes >= self.limite_compactacao:
+            self.compactar_em_segundo_plano()
+        return True
+
+    def adicionar(self, anotacao):
+        with self._lock:
+            operacao = {"op": "adicionar", "id": None, "anotacao": dict(anotacao)}
+            self._anexar(operacao)
+            return operacao["id"]
+
+    def editar(self, id_anotacao, anotacao):
+        with self._lock:
+            return self._anexar({"op": "editar", "id": id_anotacao, "anotacao": dict(anotacao, id=id_anotacao)})
+
+    def remover(self, id_anotacao):
+        with self._lock:
+            return self._anexar({"op": "remover", "id": id_anotacao})
+
+    def _gravar_snapshot_temporario(self, anotacoes, proximo_id, geracao):
+        snapshot = {"proximo_id": proximo_id, "geracao": geracao, "anotacoes": anotacoes}
+        return gravar_temporario(self.caminho_snapshot, json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+
+    # Trocar snapshot e diário juntos; exige a trava entre processos
+    def _trocar_arquivos(self, snapshot_temp, cauda, geracao):
+        conteudo = cabecalho_diario(geracao) + cauda
+        diario_temp = gravar_temporario(self.caminho_diario, conteudo)
+        os.replace(snapshot_temp, self.caminho_snapshot)
+        os.replace(diario_temp, self.caminho_diario)
+        sincronizar_diretorio(self.caminho_diario)
+        self._inode = os.stat(self.caminho_diario).st_ino
+        self._geracao = self._geracao_snapshot = geracao
+        self._posicao = len(conteudo)
+        self._operacoes = cauda.count(b"\n")
+
+    def _substituir(self, anotacoes):
+        anteriores = self._anotacoes
+        self._anotacoes = indexar_anotacoes(anotacoes, self._proximo_id)
+        self._proximo_id = max(self._proximo_id, max(self._anotacoes, default=0) + 1)
+        geracao = self._proxima_geracao()
+        snapshot_temp = self._gravar_snapshot_temporario(list(self._anotacoes.values()), self._proximo_id, geracao)
+        self._trocar_arquivos(snapshot_temp, b"", geracao)
+        self._notificar_diferencas(anteriores)
+
+    def importar(self, anotacoes):
+        with self._lock, self._travado():
+            self._substituir(anotacoes)
+
+    def compactar(self):
+        # O snapshot é escrito sem segurar as travas; só a troca dos arquivos as
+        # segura, copiando para o novo diário as operações anexadas nesse meio tempo.
+        with self._lock, self._travado():
+            self._revalidar(travado=True)
+            anotacoes = list(self._anotacoes.values())
+            proximo_id = self._proximo_id
+            inode, geracao_atual, corte = self._inode, self._geracao, self._posicao
+            geracao = self._proxima_geracao()
+        snapshot_temp = self._gravar_snapshot_temporario(anotacoes, proximo_id, geracao)
+        try:
+            with self._lock, self._travado():
+                self._revalidar(travado=True)
+                if self._inode != inode or self._geracao != geracao_atual:
+                    # Outro worker compactou antes; este snapshot ficou obsoleto
+                    os.remove(snapshot_temp)
+                    return False
+                with open(self.caminho_diario, "rb") as f:
+                    f.seek(corte)
+                    cauda = f.read(self._posicao - corte)
+                self._trocar_arquivos(snapshot_temp, cauda, geracao)
+                self.compactacoes += 1
+        except BaseException:
+            if os.path.exists(snapshot_temp):
+                os.remove(snapshot_temp)
+            raise
+        logging.info(f"Diário compactado em {self.caminho_snapshot} ({len(anotacoes)} anotações).")
+        return True
+
+    def compactar_em_segundo_plano(self):
+        with self._lock:
+            if self._compactando:
+                return
+            self._compactando = True
+
+        def executar():
+            try:
+                self.compactar()
+            except Exception as e:
+                logging.error(f"Erro ao compactar o diário: {e}")
+            finally:
+                with self._lock:
+                    self._compactando = False
+
+        threading.Thread(target=executar, name="compactacao-diario", daemon=True).start()
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(
+                super().estatisticas(),
+                operacoes_no_diario=self._operacoes,
+                geracao=self._geracao,
+                compactacoes=self.compactacoes,
+            )
@@ -0,0 +1,226 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from arquivos import assinatura_arquivo, gravar_json_atomico, gravar_temporario, sincronizar_diretorio, travar_arquivo
+
+# Backups antigos (cópia integral a cada saída de worker), aceitos por importar_legados()
+PADRAO_LEGADO = re.compile(r"anotacoes_culto_backup_(\d{8}_\d{6})\.json$")
+
+
+def sha256_bytes(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+# Snapshots antigos que a política de retenção preserva, no estilo
+# "keep-hourly/daily/weekly": o mais recente de cada uma das últimas N horas,
+# dias e semanas ISO que têm algum snapshot. O mais recente de todos sempre fica.
+def selecionar_retidos(snapshots, horas=24, dias=14, semanas=8):
+    recentes_primeiro = sorted(snapshots, key=lambda s: s["criado_em"], reverse=True)
+    retidos = set(s["id"] for s in recentes_primeiro[:1])
+    periodos = [
+        (horas, lambda d: d.strftime("%Y-%m-%d %H")),
+        (dias, lambda d: d.strftime("%Y-%m-%d")),
+        (semanas, lambda d: d.isocalendar()[:2]),
+    ]
+    for quantidade, periodo in periodos:
+        vistos = set()
+        for snapshot in recentes_primeiro:
+            if len(vistos) >= quantidade:
+                break
+            chave = periodo(datetime.fromisoformat(snapshot["criado_em"]))
+            if chave not in vistos:
+                vistos.add(chave)
+                retidos.add(snapshot["id"])
+    return retidos
+
+
+# Backups deduplicados do arquivo de anotações.
+#
+# O conteúdo é guardado uma única vez, comprimido e endereçado pelo SHA-256
+# (objetos/ab/abcdef....json.gz); o catálogo (catalogo.json) lista os snapshots
+# que apontam para ele. Um backup só é criado quando o conteúdo mudou desde o
+# último, e a assinatura (mtime, tamanho, inode) do arquivo evita até reler e
+# recalcular o hash quando nada foi tocado. Após cada backup a política de
+# retenção é aplicada e objetos sem referência são apagados.
+class GerenciadorBackup:
+    def __init__(self, diretorio, caminho, preparar=None, reter_horas=24, reter_dias=14, reter_semanas=8):
+        self.diretorio = diretorio
+        self.caminho = caminho
+        self.preparar = preparar
+        self.reter_horas = reter_horas
+        self.reter_dias = reter_dias
+        self.reter_semanas = reter_semanas
+        self.caminho_catalogo = os.path.join(diretorio, "catalogo.json")
+        self.caminho_trava = os.path.join(diretorio, ".lock")
+
+    # Trava entre processos: vários workers podem sair ao mesmo tempo
+    def _travado(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        return travar_arquivo(self.caminho_trava)
+
+    def _ler_catalogo(self):
+        try:
+            with open(self.caminho_catalogo, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"snapshots": [], "assinatura": None}
+
+    def _gravar_catalogo(self, catalogo):
+        catalogo["snapshots"].sort(key=lambda s: s["criado_em"])
+        gravar_json_atomico(self.caminho_catalogo, catalogo, indent=2)
+
+    def _caminho_objeto(self, sha256):
+        return os.path.join(self.diretorio, "objetos", sha256[:2], sha256 + ".json.gz")
+
+    def _gravar_objeto(self, sha256, conteudo):
+        caminho = self._caminho_objeto(sha256)
+        if os.path.exists(caminho):
+            return os.path.getsize(caminho)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        comprimido = gzip.compress(conteudo, mtime=0)
+        os.replace(gravar_temporario(caminho, comprimido), caminho)
+        sincronizar_diretorio(caminho)
+        return len(comprimido)
+
+    # Registrar um conteúdo como snapshot, a menos que seja igual ao snapshot
+    # imediatamente anterior. Devolve o snapshot criado ou None.
+    def _registrar(self, catalogo, conteudo, criado_em, origem):
+        sha256 = sha256_bytes(conteudo)
+        anteriores = [s for s in catalogo["snapshots"] if s["criado_em"] <= criado_em]
+        if anteriores and anteriores[-1]["sha256"] == sha256:
+            return None
+        anotacoes = json.loads(conteudo)
+        if not isinstance(anotacoes, list):
+            raise ValueError("o arquivo de anotações não contém uma lista")
+
+        ids = {s["id"] for s in catalogo["snapshots"]}
+        id_snapshot = base = criado_em.replace("-", "").replace(":", "").replace("T", "_")
+        sufixo = 1
+        while id_snapshot in ids:
+            sufixo += 1
+            id_snapshot = f"{base}-{sufixo}"
+
+        snapshot = {
+            "id": id_snapshot,
+            "criado_em": criado_em,
+            "sha256": sha256,
+            "tamanho": len(conteudo),
+            "comprimido": self._gravar_objeto(sha256, conteudo),
+            "anotacoes": len(anotacoes),
+            "origem": origem,
+        }
+        catalogo["snapshots"].append(snapshot)
+        catalogo["snapshots"].sort(key=lambda s: s["criado_em"])
+        return snapshot
+
+    # Criar um backup do estado atual, se ele mudou desde o último.
+    # Devolve o snapshot criado ou None quando não havia nada de novo.
+    def criar(self, origem="automatico"):
+        if self.preparar:
+            self.preparar()
+        with self._travado():
+            catalogo = self._ler_catalogo()
+            try:
+                with open(self.caminho, "rb") as f:
+                    assinatura = list(assinatura_arquivo(os.fstat(f.fileno())))
+                    if catalogo["snapshots"] and assinatura == catalogo.get("assinatura"):
+                        return None
+                    conteudo = f.read()
+            except FileNotFoundError:
+                logging.error(f"Arquivo {self.caminho} não encontrado; backup não criado.")
+                return None
+            criado_em = datetime.now().isoformat(timespec="seconds")
+            snapshot = self._registrar(catalogo, conteudo, criado_em, origem)
+            catalogo["assinatura"] = assinatura
+            if snapshot:
+                self._podar(catalogo)
+            self._gravar_catalogo(catalogo)
+            return snapshot
+
+    def listar(self):
+        return self._ler_catalogo()["snapshots"]
+
+    # Snapshot pelo id; "ultimo" é o mais recente
+    def obter(self, id_snapshot):
+        snapshots = self.listar()
+        if id_snapshot == "ultimo":
+            return snapshots[-1] if snapshots else None
+        return next((s for s in snapshots if s["id"] == id_snapshot), None)
+
+    # Conteúdo (bytes) de um snapshot, conferido contra o SHA-256 do catálogo
+    def ler_conteudo(self, snapshot):
+        with gzip.open(self._caminho_objeto(snapshot["sha256"]), "rb") as f:
+            conteudo = f.read()
+        if sha256_bytes(conteudo) != snapshot["sha256"]:
+            raise ValueError(f"snapshot {snapshot['id']} corrompido (SHA-256 não confere)")
+        return conteudo
+
+    def ler(self, snapshot):
+        return json.loads(self.ler_conteudo(snapshot))
+
+    # Conferir todos os snapshots: objeto presente, gzip íntegro, hash e JSON válidos.
+    # Devolve a lista de problemas encontrados (vazia se estiver tudo certo).
+    def verificar(self):
+        problemas = []
+        for snapshot in self.listar():
+            try:
+                conteudo = self.ler_conteudo(snapshot)
+                if len(conteudo) != snapshot["tamanho"]:
+                    raise ValueError(f"snapshot {snapshot['id']} com tamanho diferente do catálogo")
+                json.loads(conteudo)
+            except FileNotFoundError:
+                problemas.append(f"snapshot {snapshot['id']}: objeto {snapshot['sha256']} ausente")
+            except (OSError, EOFError, ValueError) as e:
+                problemas.append(f"snapshot {snapshot['id']}: {e}")
+        return problemas
+
+    def _podar(self, catalogo):
+        retidos = selecionar_retidos(catalogo["snapshots"], self.reter_horas, self.reter_dias, self.reter_semanas)
+        removidos = [s for s in catalogo["snapshots"] if s["id"] not in retidos]
+        catalogo["snapshots"] = [s for s in catalogo["snapshots"] if s["id"] in retidos]
+
+        # Objetos que nenhum snapshot restante referencia
+        referenciados = {s["sha256"] for s in catalogo["snapshots"]}
+        raiz_objetos = os.path.join(self.diretorio, "objetos")
+        for pasta, _, arquivos in os.walk(raiz_objetos):
+            for nome in arquivos:
+                if nome.endswith(".json.gz") and nome[:-len(".json.gz")] not in referenciados:
+                    os.remove(os.path.join(pasta, nome))
+        return removidos
+
+    # Aplicar a política de retenção; devolve os snapshots removidos
+    def podar(self):
+        with self._travado():
+            catalogo = self._ler_catalogo()
+            removidos = self._podar(catalogo)
+            self._gravar_catalogo(catalogo)
+            return removidos
+
+    # Trazer para o catálogo as cópias integrais antigas (anotacoes_culto_backup_*.json).
+    # Os arquivos originais não são apagados, e a retenção não é aplicada aqui:
+    # as cópias antigas cairiam fora da janela logo após importadas (use podar()).
+    # Devolve (importados, repetidos).
+    def importar_legados(self):
+        legados = []
+        for nome in os.listdir(self.diretorio):
+            correspondencia = PADRAO_LEGADO.match(nome)
+            if correspondencia:
+                criado_em = datetime.strptime(correspondencia.group(1), "%Y%m%d_%H%M%S")
+                legados.append((criado_em.isoformat(timespec="seconds"), os.path.join(self.diretorio, nome)))
+        importados = repetidos = 0
+        with self._travado():
+            catalogo = self._ler_catalogo()
+            for criado_em, caminho in sorted(legados):
+                with open(caminho, "rb") as f:
+                    conteudo = f.read()
+                if self._registrar(catalogo, conteudo, criado_em, f"legado:{os.path.basename(caminho)}"):
+                    importados += 1
+                else:
+                    repetidos += 1
+            self._gravar_catalogo(catalogo)
+        return importados, repetidos
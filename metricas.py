@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Limites (segundos) dos buckets dos histogramas de latência
+BUCKETS_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fases medidas dentro da requisição atual ({fase: segundos}); None fora de uma
+# requisição (threads de sincronização, CLI). Cada thread tem o seu contexto.
+_FASES_REQUISICAO = contextvars.ContextVar("fases_requisicao", default=None)
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS_PADRAO):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        # Contagens não cumulativas; exportar() acumula
+        posicao = bisect.bisect_left(self.buckets, valor)
+        if posicao < len(self.buckets):
+            self.contagens[posicao] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _escapar_rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _formatar_rotulos(rotulos, extra=None):
+    pares = list(rotulos) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar_rotulo(valor)}"' for nome, valor in pares) + "}"
+
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(int(valor))
+
+
+# Valores numéricos de um dicionário de estatísticas (bool vira 0/1,
+# datetime vira timestamp); o resto (textos, None) é ignorado
+def valores_numericos(estatisticas):
+    valores = {}
+    for chave, valor in estatisticas.items():
+        if isinstance(valor, datetime):
+            valor = valor.timestamp()
+        if isinstance(valor, (bool, int, float)):
+            valores[chave] = float(valor) if isinstance(valor, float) else int(valor)
+    return valores
+
+
+# Registro de métricas do processo: histogramas e contadores com rótulos,
+# exportados no formato texto do Prometheus. Cada worker do gunicorn tem o
+# seu registro; para uma visão de todos os workers use o log JSONL.
+class Metricas:
+    def __init__(self, prefixo="anotacoes", caminho_log=None):
+        self.prefixo = prefixo
+        self.caminho_log = caminho_log
+        self._lock = threading.Lock()
+        self._lock_log = threading.Lock()
+        self._histogramas = {}
+        self._contadores = {}
+        self._ajudas = {}
+
+    def descrever(self, nome, ajuda):
+        self._ajudas[nome] = ajuda
+
+    def observar(self, nome, valor, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma()
+            histograma.observar(valor)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    # Medir uma fase (load, parse, sync, render, save...). Fora de uma
+    # requisição só alimenta o histograma; dentro dela também entra no log.
+    @contextmanager
+    def medir(self, fase):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._registrar_fase(fase, time.perf_counter() - inicio)
+
+    def _registrar_fase(self, fase, duracao):
+        self.observar("fase_segundos", duracao, fase=fase)
+        fases = _FASES_REQUISICAO.get()
+        if fases is not None:
+            fases[fase] = fases.get(fase, 0.0) + duracao
+
+    # Medir o tempo total gasto consumindo um iterável (ex.: template em streaming)
+    def medir_iteracao(self, fase, iteravel):
+        duracao = 0.0
+        iterador = iter(iteravel)
+        try:
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    item = next(iterador)
+                except StopIteration:
+                    return
+                finally:
+                    duracao += time.perf_counter() - inicio
+                yield item
+        finally:
+            self._registrar_fase(fase, duracao)
+
+    def iniciar_requisicao(self):
+        return _FASES_REQUISICAO.set({})
+
+    def finalizar_requisicao(self, token, metodo, rota, status, duracao):
+        fases = _FASES_REQUISICAO.get() or {}
+        _FASES_REQUISICAO.reset(token)
+        self.observar("requisicao_segundos", duracao, metodo=metodo, rota=rota)
+        self.incrementar("requisicoes_total", metodo=metodo, rota=rota, status=status)
+        if self.caminho_log:
+            self._anexar_log({
+                "momento": datetime.now().isoformat(timespec="milliseconds"),
+                "pid": os.getpid(),
+                "metodo": metodo,
+                "rota": rota,
+                "status": status,
+                "duracao_ms": round(duracao * 1000, 3),
+                "fases_ms": {fase: round(segundos * 1000, 3) for fase, segundos in fases.items()},
+            })
+
+    def _anexar_log(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False) + "\n"
+        try:
+            # Uma escrita por linha em modo append: workers diferentes não se misturam
+            with self._lock_log, open(self.caminho_log, "a", encoding="utf-8") as f:
+                f.write(linha)
+        except IOError as e:
+            logging.error(f"Erro ao gravar o log de métricas: {e}")
+
+    # Texto no formato de exposição do Prometheus. medidores: {grupo: estatísticas},
+    # valores instantâneos (gauges) calculados na hora da coleta, ex.:
+    # {"fila_upload": {"profundidade": 0}} -> anotacoes_fila_upload_profundidade 0
+    def exportar(self, medidores=None):
+        with self._lock:
+            histogramas = sorted(
+                (chave, (h.buckets, list(h.contagens), h.soma, h.total)) for chave, h in self._histogramas.items()
+            )
+            contadores = sorted(self._contadores.items())
+
+        linhas = []
+        anterior = None
+        for (nome, rotulos), (buckets, contagens, soma, total) in histogramas:
+            metrica = f"{self.prefixo}_{nome}"
+            if nome != anterior:
+                linhas += [f"# HELP {metrica} {self._ajudas.get(nome, nome)}", f"# TYPE {metrica} histogram"]
+                anterior = nome
+            acumulado = 0
+            for limite, contagem in zip(buckets, contagens):
+                acumulado += contagem
+                linhas.append(f"{metrica}_bucket{_formatar_rotulos(rotulos, ('le', limite))} {acumulado}")
+            linhas.append(f"{metrica}_bucket{_formatar_rotulos(rotulos, ('le', '+Inf'))} {total}")
+            linhas.append(f"{metrica}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(soma)}")
+            linhas.append(f"{metrica}_count{_formatar_rotulos(rotulos)} {total}")
+
+        for (nome, rotulos), valor in contadores:
+            metrica = f"{self.prefixo}_{nome}"
+            if nome != anterior:
+                linhas += [f"# HELP {metrica} {self._ajudas.get(nome, nome)}", f"# TYPE {metrica} counter"]
+                anterior = nome
+            linhas.append(f"{metrica}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}")
+
+        for grupo, estatisticas in (medidores or {}).items():
+            for chave, valor in sorted(valores_numericos(estatisticas).items()):
+                metrica = f"{self.prefixo}_{grupo}_{chave}"
+                linhas += [f"# HELP {metrica} {grupo}: {chave}", f"# TYPE {metrica} gauge", f"{metrica} {_formatar_numero(valor)}"]
+        return "\n".join(linhas) + "\n"
+
+
+# Encaminha as chamadas a um cliente externo (Dropbox), contando chamadas e
+# erros e medindo a latência de cada método
+class ClienteInstrumentado:
+    def __init__(self, cliente, metricas, servico="dropbox"):
+        self._cliente = cliente
+        self._metricas = metricas
+        self._servico = servico
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._cliente, nome)
+        if not callable(atributo):
+            return atributo
+
+        def chamar(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = "erro"
+            try:
+                retorno = atributo(*args, **kwargs)
+                resultado = "ok"
+                return retorno
+            finally:
+                self._metricas.observar(
+                    "chamada_externa_segundos", time.perf_counter() - inicio, servico=self._servico, metodo=nome
+                )
+                self._metricas.incrementar(
+                    "chamadas_externas_total", servico=self._servico, metodo=nome, resultado=resultado
+                )
+        return chamar
+
+
+# Registro global do processo, usado pelos módulos para medir suas fases
+metricas = Metricas(caminho_log=os.getenv("METRICAS_LOG") or None)
+metricas.descrever("requisicao_segundos", "Latência das requisições HTTP por rota.")
+metricas.descrever("requisicoes_total", "Requisições HTTP atendidas por rota e status.")
+metricas.descrever("fase_segundos", "Tempo gasto em cada fase (load, parse, sync, render, save, backup).")
+metricas.descrever("chamada_externa_segundos", "Latência das chamadas ao Dropbox por método.")
+metricas.descrever("chamadas_externas_total", "Chamadas ao Dropbox por método e resultado.")
+medir = metricas.medir
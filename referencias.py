@@ -0,0 +1,171 @@
+import re
+from collections import namedtuple
+
+from busca import normalizar
+
+# Livros da Bíblia na ordem canônica, com as abreviações mais usadas no Brasil
+LIVROS = [
+    ("Gênesis", ["Gn", "Gen"]),
+    ("Êxodo", ["Ex", "Êx"]),
+    ("Levítico", ["Lv", "Lev"]),
+    ("Números", ["Nm", "Num"]),
+    ("Deuteronômio", ["Dt", "Deut", "Deuteronómio"]),
+    ("Josué", ["Js"]),
+    ("Juízes", ["Jz"]),
+    ("Rute", ["Rt"]),
+    ("1 Samuel", ["1Sm", "1Sam"]),
+    ("2 Samuel", ["2Sm", "2Sam"]),
+    ("1 Reis", ["1Rs"]),
+    ("2 Reis", ["2Rs"]),
+    ("1 Crônicas", ["1Cr", "1Cron"]),
+    ("2 Crônicas", ["2Cr", "2Cron"]),
+    ("Esdras", ["Ed", "Esd"]),
+    ("Neemias", ["Ne", "Nee"]),
+    ("Ester", ["Et", "Est"]),
+    ("Jó", []),
+    ("Salmos", ["Sl", "Sal", "Salmo"]),
+    ("Provérbios", ["Pv", "Prov"]),
+    ("Eclesiastes", ["Ec", "Ecl"]),
+    ("Cântico dos Cânticos", ["Ct", "Cânticos", "Cantares", "Cântico"]),
+    ("Isaías", ["Is"]),
+    ("Jeremias", ["Jr", "Jer"]),
+    ("Lamentações", ["Lm", "Lam"]),
+    ("Ezequiel", ["Ez"]),
+    ("Daniel", ["Dn", "Dan"]),
+    ("Oséias", ["Os", "Oseias"]),
+    ("Joel", ["Jl"]),
+    ("Amós", ["Am"]),
+    ("Obadias", ["Ob", "Obd"]),
+    ("Jonas", ["Jn"]),
+    ("Miquéias", ["Mq", "Miqueias"]),
+    ("Naum", ["Na"]),
+    ("Habacuque", ["Hc"]),
+    ("Sofonias", ["Sf"]),
+    ("Ageu", ["Ag"]),
+    ("Zacarias", ["Zc", "Zac"]),
+    ("Malaquias", ["Ml", "Mal"]),
+    ("Mateus", ["Mt"]),
+    ("Marcos", ["Mc"]),
+    ("Lucas", ["Lc"]),
+    ("João", ["Jo"]),
+    ("Atos", ["At", "Atos dos Apóstolos"]),
+    ("Romanos", ["Rm", "Rom"]),
+    ("1 Coríntios", ["1Co", "1Cor"]),
+    ("2 Coríntios", ["2Co", "2Cor"]),
+    ("Gálatas", ["Gl", "Gal"]),
+    ("Efésios", ["Ef"]),
+    ("Filipenses", ["Fp", "Fil"]),
+    ("Colossenses", ["Cl", "Col"]),
+    ("1 Tessalonicenses", ["1Ts"]),
+    ("2 Tessalonicenses", ["2Ts"]),
+    ("1 Timóteo", ["1Tm", "1Tim"]),
+    ("2 Timóteo", ["2Tm", "2Tim"]),
+    ("Tito", ["Tt"]),
+    ("Filemom", ["Fm", "Filemon"]),
+    ("Hebreus", ["Hb", "Heb"]),
+    ("Tiago", ["Tg"]),
+    ("1 Pedro", ["1Pe", "1Pd"]),
+    ("2 Pedro", ["2Pe", "2Pd"]),
+    ("1 João", ["1Jo"]),
+    ("2 João", ["2Jo"]),
+    ("3 João", ["3Jo"]),
+    ("Judas", ["Jd"]),
+    ("Apocalipse", ["Ap", "Apoc"]),
+]
+
+# Posição canônica de cada livro (0 = Gênesis)
+ORDEM_LIVROS = {nome: ordem for ordem, (nome, _) in enumerate(LIVROS)}
+
+# Um intervalo de uma passagem: "3:16-18" -> Trecho(3, 16, 3, 18).
+# Capítulos inteiros têm versiculo None ("Salmos 23" -> Trecho(23, None, 23, None)).
+Trecho = namedtuple("Trecho", "capitulo versiculo capitulo_fim versiculo_fim")
+
+# Passagem analisada; ordem é None quando o livro não foi reconhecido
+Referencia = namedtuple("Referencia", "livro ordem trechos")
+
+
+# Forma comparável de um nome: minúsculas, "I Coríntios"/"1ª Coríntios" -> "1coríntios"
+def _chave(texto):
+    chave = " ".join(texto.lower().split())
+    chave = re.sub(r"^(iii|ii|i)\s+", lambda m: str(len(m.group(1))) + " ", chave)
+    return re.sub(r"^([1-3])\s*[ªºao]?\.?\s*", r"\1", chave)
+
+
+def _montar_apelidos():
+    # Nomes com acento primeiro, depois abreviações e por fim os nomes sem
+    # acento, sem sobrescrever: assim "Jó" é Jó e "Jo" continua sendo João.
+    apelidos = {}
+    for nome, abreviacoes in LIVROS:
+        apelidos[_chave(nome)] = nome
+    for nome, abreviacoes in LIVROS:
+        for abreviacao in abreviacoes:
+            apelidos.setdefault(_chave(abreviacao), nome)
+    for nome, abreviacoes in LIVROS:
+        for apelido in [nome] + abreviacoes:
+            apelidos.setdefault(normalizar(_chave(apelido)), nome)
+    return apelidos
+
+
+APELIDOS = _montar_apelidos()
+# O apelido mais longo vence ("1 João" antes de "João"); não pode ser seguido de letra
+PADRAO_LIVRO = re.compile(
+    r"^(%s)(?![^\W\d_])\.?" % "|".join(re.escape(a) for a in sorted(APELIDOS, key=len, reverse=True))
+)
+PADRAO_INTERVALO = re.compile(r"(\d+)(?:\s*[:.]\s*(\d+))?(?:\s*[-–]\s*(\d+)(?:\s*[:.]\s*(\d+))?)?")
+
+
+# Nome canônico do livro a partir do que foi digitado ("1Co", "i coríntios"...)
+def identificar_livro(texto):
+    correspondencia = PADRAO_LIVRO.match(_chave(texto or ""))
+    return (APELIDOS[correspondencia.group(1)], correspondencia.end()) if correspondencia else (None, 0)
+
+
+def _analisar_trechos(texto):
+    # ";" separa capítulos; depois de "3:16", números soltos após "," são versículos do capítulo 3
+    trechos = []
+    for grupo in re.split(r"[;]", texto):
+        capitulo_atual = None
+        for parte in grupo.split(","):
+            correspondencia = PADRAO_INTERVALO.search(parte)
+            if not correspondencia:
+                continue
+            a, b, c, d = (int(x) if x else None for x in correspondencia.groups())
+            if b is not None:
+                # 3:16, 3:16-18 ou 3:16-4:2
+                capitulo_atual = a
+                if d is not None:
+                    trechos.append(Trecho(a, b, c, d))
+                else:
+                    trechos.append(Trecho(a, b, a, c if c is not None else b))
+            elif capitulo_atual is not None:
+                # Versículos soltos no mesmo capítulo: "3:16, 18-20"
+                trechos.append(Trecho(capitulo_atual, a, capitulo_atual, c if c is not None else a))
+            else:
+                # Capítulos inteiros: 5 ou 5-7
+                trechos.append(Trecho(a, None, c if c is not None else a, None))
+    return trechos
+
+
+# Analisar uma passagem como "1 Coríntios 13:4-7", "Jo 3.16; 4:1-3" ou
+# "Cântico dos Cânticos 2". Livros desconhecidos ficam com o texto antes do
+# primeiro número e ordem None.
+def analisar_referencia(texto):
+    texto = (texto or "").strip()
+    livro, fim = identificar_livro(texto)
+    if livro is None:
+        correspondencia = re.match(r"\s*((?:[1-3]\s*)?\D+?)\s*(?=\d|$)", texto)
+        nome = correspondencia.group(1).strip() if correspondencia else ""
+        return Referencia(nome, None, _analisar_trechos(texto[len(nome):]))
+    resto = _chave(texto)[fim:]
+    return Referencia(livro, ORDEM_LIVROS[livro], _analisar_trechos(resto))
+
+
+# Chave para ordenar passagens na ordem bíblica (livros desconhecidos no fim)
+def chave_ordenacao(referencia):
+    primeiro = referencia.trechos[0] if referencia.trechos else Trecho(0, None, 0, None)
+    return (
+        referencia.ordem if referencia.ordem is not None else len(LIVROS),
+        referencia.livro,
+        primeiro.capitulo,
+        primeiro.versiculo or 0,
+    )
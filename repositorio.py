@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import re
+import threading
+
+from arquivos import assinatura_arquivo, gravar_json_atomico
+from busca import IndiceBusca
+from metricas import medir
+from referencias import analisar_referencia
+
+
+# Ler uma lista de anotações no formato do anotacoes_culto.json
+def ler_json_anotacoes(caminho):
+    try:
+        with medir("parse"), open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logging.error(f"Arquivo {caminho} não encontrado.")
+        return []
+    except json.JSONDecodeError:
+        logging.error("Erro ao decodificar o arquivo JSON.")
+        return []
+
+
+# Numa releitura do disco, acima desta fração de anotações alteradas os
+# observadores recebem um "recarregar" em vez de um evento por anotação
+LIMITE_DIFERENCAS = 0.25
+
+# Ordenações aceitas por consultar()
+ORDENS = ("data_desc", "data_asc", "id")
+
+# Campos de uma anotação, como no formulário e no anotacoes_culto.json
+CAMPOS = ("data", "tema", "passagem_biblica", "anotacoes_culto", "devocional")
+
+
+def chave_conteudo(anotacao):
+    return tuple(anotacao.get(campo, "") for campo in CAMPOS)
+
+
+# Converter a data digitada (DD/MM/AAAA) para AAAA-MM-DD, ordenável; None se inválida
+def data_iso(data):
+    correspondencia = re.match(r"\s*(\d{2})/(\d{2})/(\d{4})", data or "")
+    if not correspondencia:
+        return None
+    dia, mes, ano = correspondencia.groups()
+    return f"{ano}-{mes}-{dia}"
+
+
+# Nome canônico do livro em uma passagem ("1Co 13:4-7" -> "1 Coríntios")
+def extrair_livro(passagem):
+    return analisar_referencia(passagem).livro
+
+
+# Indexar uma lista de anotações por id estável.
+# Anotações antigas (sem "id") recebem ids novos, na ordem em que aparecem, a
+# partir de proximo_id (o próximo id guardado pelo backend) ou do maior id + 1.
+def indexar_anotacoes(lista, proximo_id=1):
+    ids = [a["id"] for a in lista if isinstance(a.get("id"), int)]
+    proximo_id = max(proximo_id, max(ids, default=0) + 1)
+    por_id = {}
+    for anotacao in lista:
+        anotacao = dict(anotacao)
+        if not isinstance(anotacao.get("id"), int) or anotacao["id"] in por_id:
+            anotacao["id"] = proximo_id
+            proximo_id += 1
+        por_id[anotacao["id"]] = anotacao
+    return por_id
+
+
+# Base dos repositórios: mantém as anotações em memória, indexadas por id.
+# Cada backend implementa _revalidar() (atualiza self._anotacoes se o disco
+# mudou) e as operações de escrita.
+#
+# Observadores (índice de busca, agregados) recebem cada alteração:
+# ("adicionar", anotacao), ("editar", anotacao), ("remover", id) ou
+# ("recarregar", None) quando o conteúdo mudou por fora e deve ser relido.
+class RepositorioBase:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._anotacoes = None
+        self._observadores = []
+        self._indice_busca = None
+        self._indice_busca_sujo = True
+        self._eventos_indice_busca = None
+        self._lock_indice_busca = threading.Lock()
+        self.reconstrucoes_indice = 0
+        self.acertos = 0
+        self.falhas = 0
+        # Escritas vistas por este processo (ver versao())
+        self.escritas = 0
+
+    def _revalidar(self):
+        raise NotImplementedError
+
+    # Trava que as escritas deste processo seguram enquanto alteram o armazenamento
+    def travar_escritas(self):
+        return self._lock
+
+    # Marcador que muda a cada escrita no armazenamento, de qualquer worker; o
+    # sync do Dropbox compara antes e depois do download para não sobrescrever
+    # uma alteração local. No JSON as escritas dos outros workers já mudam a
+    # assinatura do arquivo, que o sync também compara.
+    def versao(self):
+        return self.escritas
+
+    def revalidar(self):
+        with self._lock:
+            self._revalidar()
+
+    def observar(self, observador):
+        with self._lock:
+            self._observadores.append(observador)
+
+    def _notificar(self, evento, dados=None):
+        if evento != "recarregar":
+            self.escritas += 1
+        for observador in self._observadores:
+            observador(evento, dados)
+
+    # Avisar os observadores do que mudou em self._anotacoes depois de reler o
+    # disco (ex.: escrita de outro worker). Poucas mudanças viram eventos
+    # adicionar/editar/remover, e o índice de busca e os agregados só se
+    # atualizam; na primeira carga ou quando quase tudo mudou, "recarregar".
+    def _notificar_diferencas(self, anteriores):
+        if anteriores is None:
+            self._notificar("recarregar")
+            return
+        eventos = [("remover", id_anotacao) for id_anotacao in anteriores.keys() - self._anotacoes.keys()]
+        for id_anotacao, anotacao in self._anotacoes.items():
+            anterior = anteriores.get(id_anotacao)
+            if anterior is None:
+                eventos.append(("adicionar", anotacao))
+            elif anterior != anotacao:
+                eventos.append(("editar", anotacao))
+        if len(eventos) > LIMITE_DIFERENCAS * max(len(self._anotacoes), len(anteriores)):
+            self._notificar("recarregar")
+            return
+        for evento, dados in eventos:
+            self._notificar(evento, dados)
+
+    def listar(self):
+        with self._lock:
+            self._revalidar()
+            return list(self._anotacoes.values())
+
+    # Compatibilidade com o antigo carregar_anotacoes()
+    carregar = listar
+
+    def obter(self, id_anotacao):
+        with self._lock:
+            self._revalidar()
+            return self._anotacoes.get(id_anotacao)
+
+    # Filtrar por tema, livro e intervalo de datas (AAAA-MM-DD, inclusivo),
+    # ordenar pela data real e paginar. Devolve (página, total filtrado).
+    # Varre a coleção em memória; o backend SQLite usa os índices do banco.
+    def consultar(self, tema=None, livro=None, data_inicio=None, data_fim=None,
+                  ordem="data_desc", limite=None, deslocamento=0):
+        resultado = []
+        for anotacao in self.listar():
+            if tema and anotacao.get("tema") != tema:
+                continue
+            if livro and extrair_livro(anotacao.get("passagem_biblica")) != livro:
+                continue
+            if data_inicio or data_fim:
+                data = data_iso(anotacao.get("data"))
+                if data is None or (data_inicio and data < data_inicio) or (data_fim and data > data_fim):
+                    continue
+            resultado.append(anotacao)
+
+        if ordem == "id":
+            resultado.sort(key=lambda a: a["id"])
+        else:
+            # Datas inválidas ficam no fim da ordem decrescente, como no SQLite
+            resultado.sort(
+                key=lambda a: (data_iso(a.get("data")) or "", a["id"]),
+                reverse=(ordem != "data_asc"),
+            )
+        total = len(resultado)
+        if limite is not None:
+            resultado = resultado[deslocamento:deslocamento + limite]
+        return resultado, total
+
+    # Percorrer todas as anotações filtradas, uma a uma (exportação em streaming)
+    def iterar(self, **filtros):
+        anotacoes, _ = self.consultar(**filtros)
+        yield from anotacoes
+
+    # Acrescentar anotações de outros arquivos (ex.: snapshots em backups/),
+    # ignorando as que já existem com o mesmo conteúdo. Devolve quantas entraram.
+    def mesclar(self, anotacoes):
+        with self._lock:
+            atuais = self.listar()
+            existentes = {chave_conteudo(a) for a in atuais}
+            novas = []
+            for anotacao in anotacoes:
+                chave = chave_conteudo(anotacao)
+                if chave not in existentes:
+                    existentes.add(chave)
+                    novas.append({campo: anotacao.get(campo, "") for campo in CAMPOS})
+            if novas:
+                self.importar(atuais + novas)
+            return len(novas)
+
+    def exportar_json(self, caminho):
+        gravar_json_atomico(caminho, self.listar())
+
+    # Busca textual no índice invertido em memória, criado no primeiro uso e
+    # mantido em dia pelas notificações de escrita (inclusive as diferenças
+    # vistas ao reler o disco, ver _notificar_diferencas).
+    def buscar(self, consulta, limite=20):
+        with self._lock:
+            if self._indice_busca is None:
+                self._indice_busca = IndiceBusca()
+                self.observar(self._atualizar_indice_busca)
+            self._revalidar()
+            indice = None if self._indice_busca_sujo else self._indice_busca
+        if indice is None:
+            indice = self._reconstruir_indice_busca()
+        return indice.buscar(consulta, limite)
+
+    # Reconstruir o índice fora da trava do repositório, para não bloquear
+    # escritas e o sync durante a indexação; as alterações que chegarem nesse
+    # meio tempo são reaplicadas no índice novo. Uma reconstrução por vez:
+    # buscas simultâneas esperam a que está em andamento e usam o seu resultado.
+    def _reconstruir_indice_busca(self):
+        with self._lock_indice_busca:
+            with self._lock:
+                if not self._indice_busca_sujo:
+                    return self._indice_busca
+                anotacoes = list(self._anotacoes.values())
+                eventos = self._eventos_indice_busca = []
+            indice = IndiceBusca()
+            indice.reconstruir(anotacoes)
+            with self._lock:
+                self._eventos_indice_busca = None
+                self._indice_busca = indice
+                self._indice_busca_sujo = False
+                self.reconstrucoes_indice += 1
+                for evento, dados in eventos:
+                    self._atualizar_indice_busca(evento, dados)
+                return indice
+
+    def _atualizar_indice_busca(self, evento, dados):
+        if self._eventos_indice_busca is not None:
+            self._eventos_indice_busca.append((evento, dados))
+        if evento == "recarregar":
+            self._indice_busca_sujo = True
+        elif evento == "remover":
+            self._indice_busca.remover(dados)
+        elif not self._indice_busca_sujo:
+            self._indice_busca.adicionar(dados)
+
+    def estatisticas(self):
+        with self._lock:
+            estatisticas = {"acertos": self.acertos, "falhas": self.falhas,
+                            "reconstrucoes_indice": self.reconstrucoes_indice}
+            if self._indice_busca is not None:
+                estatisticas.update(self._indice_busca.estatisticas())
+            return estatisticas
+
+
+# Repositório sobre o anotacoes_culto.json, com cache em memória (um por worker
+# do gunicorn). O JSON só é relido quando outro worker ou o sync do Dropbox
+# altera o arquivo; cada escrita regrava o arquivo inteiro.
+#
+# O próximo id fica em um arquivo ao lado (.proximo_id), já que o JSON continua
+# sendo só a lista de anotações: assim o id de uma anotação excluída nunca é
+# reaproveitado, e um /editar/<id> antigo não atinge outra anotação.
+class RepositorioJSON(RepositorioBase):
+    def __init__(self, caminho, ao_faltar_arquivo=None):
+        super().__init__()
+        self.caminho = caminho
+        self.caminho_proximo_id = os.path.splitext(caminho)[0] + ".proximo_id"
+        self.ao_faltar_arquivo = ao_faltar_arquivo
+        self._assinatura = None
+
+    def _assinatura_atual(self):
+        try:
+            return assinatura_arquivo(os.stat(self.caminho))
+        except FileNotFoundError:
+            return None
+
+    def _revalidar(self):
+        assinatura = self._assinatura_atual()
+        if assinatura is None and self.ao_faltar_arquivo is not None:
+            self.ao_faltar_arquivo()
+            assinatura = self._assinatura_atual()
+
+        if self._anotacoes is not None and assinatura == self._assinatura:
+            self.acertos += 1
+            return
+        self.falhas += 1
+        with medir("load"):
+            anteriores = self._anotacoes
+            self._anotacoes = indexar_anotacoes(ler_json_anotacoes(self.caminho), self._ler_proximo_id())
+            self._assinatura = assinatura
+            self._notificar_diferencas(anteriores)
+
+    def _gravar(self):
+        status = gravar_json_atomico(self.caminho, list(self._anotacoes.values()))
+        self._assinatura = assinatura_arquivo(status)
+
+    def _ler_proximo_id(self):
+        try:
+            with open(self.caminho_proximo_id, "r", encoding="utf-8") as f:
+                return int(json.load(f))
+        except (FileNotFoundError, ValueError, TypeError):
+            return 1
+
+    # Os ids em uso são reservados antes de gravar as anotações: uma queda
+    # entre as duas escritas só pula números
+    def _reservar_ids(self):
+        proximo_id = max(self._anotacoes, default=0) + 1
+        if proximo_id > self._ler_proximo_id():
+            gravar_json_atomico(self.caminho_proximo_id, proximo_id)
+
+    def adicionar(self, anotacao):
+        with self._lock:
+            self._revalidar()
+            id_anotacao = max(self._ler_proximo_id(), max(self._anotacoes, default=0) + 1)
+            anotacao = dict(anotacao, id=id_anotacao)
+            self._anotacoes[id_anotacao] = anotacao
+            self._reservar_ids()
+            self._gravar()
+            self._notificar("adicionar", anotacao)
+            return anotacao["id"]
+
+    def editar(self, id_anotacao, anotacao):
+        with self._lock:
+            self._revalidar()
+            if id_anotacao not in self._anotacoes:
+                return False
+            self._anotacoes[id_anotacao] = dict(anotacao, id=id_anotacao)
+            self._gravar()
+            self._notificar("editar", self._anotacoes[id_anotacao])
+            return True
+
+    def remover(self, id_anotacao):
+        with self._lock:
+            self._revalidar()
+            if self._anotacoes.pop(id_anotacao, None) is None:
+                return False
+            self._gravar()
+            self._notificar("remover", id_anotacao)
+            return True
+
+    def importar(self, anotacoes):
+        with self._lock:
+            anteriores = self._anotacoes
+            self._anotacoes = indexar_anotacoes(anotacoes, self._ler_proximo_id())
+            self._reservar_ids()
+            self._gravar()
+            self._notificar_diferencas(anteriores)
+
+    def exportar_json(self, caminho):
+        # O próprio arquivo do repositório já está no formato de exportação
+        if os.path.abspath(caminho) != os.path.abspath(self.caminho):
+            super().exportar_json(caminho)
+
+    def invalidar(self):
+        with self._lock:
+            self._anotacoes = None
+            self._assinatura = None
+            self._notificar("recarregar")
+
+
+# Criar o repositório configurado (ARMAZENAMENTO no .env)
+def criar_repositorio(tipo, caminho, ao_faltar_arquivo=None, **opcoes):
+    if tipo == "json":
+        return RepositorioJSON(caminho, ao_faltar_arquivo=ao_faltar_arquivo)
+    if tipo == "diario":
+        from diario import RepositorioDiario
+        return RepositorioDiario(caminho, ao_faltar_arquivo=ao_faltar_arquivo, **opcoes)
+    if tipo == "sqlite":
+        from banco import RepositorioSQLite
+        return RepositorioSQLite(caminho, ao_faltar_arquivo=ao_faltar_arquivo)
+    raise ValueError(f"Tipo de armazenamento desconhecido: {tipo}")
@@ -0,0 +1,422 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import dropbox
+
+from metricas import medir
+
+# Tamanho de bloco usado pelo content_hash do Dropbox
+BLOCO_CONTENT_HASH = 4 * 1024 * 1024
+# Acima deste tamanho o upload é feito em uma sessão, em blocos
+LIMITE_UPLOAD_SIMPLES = 8 * 1024 * 1024
+BLOCO_UPLOAD_SESSAO = 4 * 1024 * 1024
+
+
+# Calcular o content_hash de um arquivo local no mesmo formato do Dropbox:
+# SHA-256 da concatenação dos SHA-256 de cada bloco de 4 MB.
+def calcular_content_hash(caminho):
+    hashes = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        while True:
+            bloco = f.read(BLOCO_CONTENT_HASH)
+            if not bloco:
+                break
+            hashes.update(hashlib.sha256(bloco).digest())
+    return hashes.hexdigest()
+
+
+# Baixar um arquivo do Dropbox para um temporário no diretório do arquivo
+# local; quem chama decide se troca (os.replace) ou descarta.
+def baixar_temporario(cliente, caminho_dropbox, caminho_local):
+    diretorio = os.path.dirname(os.path.abspath(caminho_local))
+    fd, caminho_temp = tempfile.mkstemp(prefix=".download_", dir=diretorio)
+    os.close(fd)
+    try:
+        cliente.files_download_to_file(caminho_temp, caminho_dropbox)
+        os.chmod(caminho_temp, 0o644)
+    except BaseException:
+        os.remove(caminho_temp)
+        raise
+    return caminho_temp
+
+
+# Baixar e trocar pelo local com os.replace, para que nenhuma requisição leia
+# um arquivo pela metade.
+def baixar_atomico(cliente, caminho_dropbox, caminho_local):
+    caminho_temp = baixar_temporario(cliente, caminho_dropbox, caminho_local)
+    try:
+        os.replace(caminho_temp, caminho_local)
+    finally:
+        if os.path.exists(caminho_temp):
+            os.remove(caminho_temp)
+
+
+# Cliente que só é criado na primeira chamada. Os comandos do CLI que não
+# falam com o Dropbox (flask backups listar, verificar...) rodam sem o token.
+class ClientePreguicoso:
+    def __init__(self, criar):
+        self._criar = criar
+        self._cliente = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, nome):
+        with self._lock:
+            if self._cliente is None:
+                self._cliente = self._criar()
+        return getattr(self._cliente, nome)
+
+
+# Cliente falso do Dropbox, baseado em um diretório local.
+# Implementa apenas as chamadas usadas pela aplicação, para testes e benchmarks offline.
+class ClienteDropboxFalso:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.chamadas = {}
+        self._sessoes = {}
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _registrar(self, nome):
+        self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+
+    def _caminho(self, caminho_dropbox):
+        return os.path.join(self.diretorio, caminho_dropbox.lstrip("/"))
+
+    def _erro_nao_encontrado(self, caminho_dropbox):
+        return dropbox.exceptions.ApiError(
+            None, f"path/not_found: {caminho_dropbox}", None, None
+        )
+
+    def files_get_metadata(self, caminho_dropbox):
+        self._registrar("files_get_metadata")
+        return self._metadata(caminho_dropbox)
+
+    def _metadata(self, caminho_dropbox):
+        caminho = self._caminho(caminho_dropbox)
+        if not os.path.exists(caminho):
+            raise self._erro_nao_encontrado(caminho_dropbox)
+        status = os.stat(caminho)
+        return SimpleNamespace(
+            name=os.path.basename(caminho),
+            path_display=caminho_dropbox,
+            # O Dropbox devolve server_modified em UTC, sem fuso
+            server_modified=datetime.fromtimestamp(status.st_mtime, timezone.utc).replace(tzinfo=None),
+            size=status.st_size,
+            rev=f"{status.st_mtime_ns:x}",
+            content_hash=calcular_content_hash(caminho),
+        )
+
+    def files_download_to_file(self, caminho_local, caminho_dropbox):
+        self._registrar("files_download_to_file")
+        caminho = self._caminho(caminho_dropbox)
+        if not os.path.exists(caminho):
+            raise self._erro_nao_encontrado(caminho_dropbox)
+        shutil.copyfile(caminho, caminho_local)
+        return self._metadata(caminho_dropbox)
+
+    def files_upload(self, conteudo, caminho_dropbox, mode=None):
+        self._registrar("files_upload")
+        caminho = self._caminho(caminho_dropbox)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+        return self._metadata(caminho_dropbox)
+
+    def files_upload_session_start(self, conteudo):
+        self._registrar("files_upload_session_start")
+        session_id = f"sessao-{len(self._sessoes) + 1}"
+        self._sessoes[session_id] = bytearray(conteudo)
+        return SimpleNamespace(session_id=session_id)
+
+    def files_upload_session_append_v2(self, conteudo, cursor):
+        self._registrar("files_upload_session_append_v2")
+        self._sessoes[cursor.session_id] += conteudo
+
+    def files_upload_session_finish(self, conteudo, cursor, commit):
+        self._registrar("files_upload_session_finish")
+        dados = self._sessoes.pop(cursor.session_id) + conteudo
+        caminho = self._caminho(commit.path)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as f:
+            f.write(dados)
+        return self._metadata(commit.path)
+
+
+# Sincronização em segundo plano com o Dropbox (uma thread por worker).
+# As rotas nunca tocam a rede: só leem o arquivo local, trocado atomicamente aqui.
+#
+# trava é a mesma trava das escritas do repositório e versao_local devolve algo
+# que muda a cada escrita no armazenamento, também as de outros workers: a troca
+# pelo arquivo baixado (e o ao_baixar) acontece segurando a trava e só se nada
+# mudou localmente durante o download.
+class SincronizadorDropbox:
+    def __init__(self, cliente, caminho_dropbox, caminho_local, intervalo=60, fila_upload=None, ao_baixar=None,
+                 trava=None, versao_local=None):
+        self.cliente = cliente
+        self.fila_upload = fila_upload
+        self.ao_baixar = ao_baixar
+        self.trava = trava or threading.RLock()
+        self.versao_local = versao_local
+        self.caminho_dropbox = caminho_dropbox
+        self.caminho_local = caminho_local
+        self.intervalo = intervalo
+        self.ultima_verificacao = None
+        self.ultimo_download = None
+        self._hash_local = None
+        self._assinatura_hash_local = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _content_hash_local(self):
+        # Só recalcula o hash quando o arquivo local mudou desde a última vez
+        status = os.stat(self.caminho_local)
+        assinatura = (status.st_mtime_ns, status.st_size, status.st_ino)
+        if assinatura != self._assinatura_hash_local:
+            self._hash_local = calcular_content_hash(self.caminho_local)
+            self._assinatura_hash_local = assinatura
+        return self._hash_local
+
+    def baixar(self):
+        try:
+            with medir("sync"):
+                baixar_atomico(self.cliente, self.caminho_dropbox, self.caminho_local)
+            self.ultimo_download = datetime.now()
+            logging.info("Arquivo baixado com sucesso do Dropbox.")
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao baixar o arquivo do Dropbox: {e}")
+            return False
+
+    # Estado local no início do sync: assinatura do arquivo e versão do repositório
+    def _estado_local(self):
+        try:
+            status = os.stat(self.caminho_local)
+            assinatura = (status.st_mtime_ns, status.st_size, status.st_ino)
+        except FileNotFoundError:
+            assinatura = None
+        return assinatura, self.versao_local() if self.versao_local is not None else None
+
+    def _trocar_se_inalterado(self, caminho_temp, estado):
+        with self.trava:
+            if (self.fila_upload is not None and self.fila_upload.ocupada()) or self._estado_local() != estado:
+                logging.info("Houve escrita local durante o download; a versão do Dropbox foi descartada.")
+                return False
+            os.replace(caminho_temp, self.caminho_local)
+            self.ultimo_download = datetime.now()
+            logging.info("Arquivo baixado com sucesso do Dropbox.")
+            if self.ao_baixar is not None:
+                self.ao_baixar()
+            return True
+
+    def sincronizar_agora(self):
+        with self._lock:
+            self.ultima_verificacao = datetime.now()
+            estado = self._estado_local()
+            try:
+                metadata = self.cliente.files_get_metadata(self.caminho_dropbox)
+            except dropbox.exceptions.ApiError as e:
+                logging.error(f"Erro ao obter metadata do Dropbox: {e}")
+                return False
+            except Exception as e:
+                logging.error(f"Erro de rede ao consultar o Dropbox: {e}")
+                return False
+
+            if self.fila_upload is not None and self.fila_upload.ocupada():
+                # Há gravações locais ainda não enviadas: não sobrescrever com a versão remota
+                return False
+
+            if os.path.exists(self.caminho_local):
+                if metadata.content_hash == self._content_hash_local():
+                    return False
+                # Conteúdo diferente, mas a cópia local é mais nova: ela será enviada, não sobrescrita
+                modificado_local = datetime.fromtimestamp(
+                    os.path.getmtime(self.caminho_local), timezone.utc
+                ).replace(tzinfo=None)
+                if metadata.server_modified <= modificado_local:
+                    logging.info("O arquivo local está atualizado com a versão do Dropbox. Nenhum download necessário.")
+                    return False
+
+            try:
+                with medir("sync"):
+                    caminho_temp = baixar_temporario(self.cliente, self.caminho_dropbox, self.caminho_local)
+            except Exception as e:
+                logging.error(f"Erro ao baixar o arquivo do Dropbox: {e}")
+                return False
+            try:
+                return self._trocar_se_inalterado(caminho_temp, estado)
+            finally:
+                if os.path.exists(caminho_temp):
+                    os.remove(caminho_temp)
+
+    def _executar(self):
+        while not self._parar.is_set():
+            self.sincronizar_agora()
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        if self.intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="sincronizador-dropbox", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=5):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# Envio ao Dropbox em segundo plano (write-behind).
+# Gravações feitas dentro da janela são agrupadas em um único upload do arquivo
+# local, com novas tentativas e espera exponencial em caso de falha.
+class FilaUpload:
+    def __init__(self, cliente, caminho_local, caminho_dropbox, janela=2.0,
+                 janela_maxima=30.0, tentativas=5, espera_inicial=1.0, espera_maxima=60.0, preparar=None):
+        self.cliente = cliente
+        self.preparar = preparar
+        self.caminho_local = caminho_local
+        self.caminho_dropbox = caminho_dropbox
+        self.janela = janela
+        self.janela_maxima = janela_maxima
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.pendentes = 0
+        self.enviados = 0
+        self.falhas = 0
+        self.ultimo_sucesso = None
+        self.ultimo_erro = None
+        self._enviando = False
+        self._primeira_escrita = None
+        self._ultima_escrita = None
+        self._condicao = threading.Condition()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def agendar(self):
+        with self._condicao:
+            agora = time.monotonic()
+            if self.pendentes == 0:
+                self._primeira_escrita = agora
+            self.pendentes += 1
+            self._ultima_escrita = agora
+            self._condicao.notify_all()
+        self._iniciar()
+
+    def ocupada(self):
+        with self._condicao:
+            return self.pendentes > 0 or self._enviando
+
+    def estado(self):
+        with self._condicao:
+            return {
+                "profundidade": self.pendentes,
+                "enviando": self._enviando,
+                "enviados": self.enviados,
+                "falhas": self.falhas,
+                "ultimo_sucesso": self.ultimo_sucesso,
+                "ultimo_erro": self.ultimo_erro,
+            }
+
+    def _iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="fila-upload-dropbox", daemon=True)
+        self._thread.start()
+
+    def _aguardar_lote(self):
+        # Espera a janela sem novas gravações (ou o limite máximo) e retira o lote
+        with self._condicao:
+            while self.pendentes == 0 and not self._parar.is_set():
+                self._condicao.wait()
+            while not self._parar.is_set():
+                agora = time.monotonic()
+                restante = min(
+                    self._ultima_escrita + self.janela,
+                    self._primeira_escrita + self.janela_maxima,
+                ) - agora
+                if restante <= 0:
+                    break
+                self._condicao.wait(restante)
+            lote = self.pendentes
+            self.pendentes = 0
+            self._enviando = lote > 0
+            return lote
+
+    def _executar(self):
+        while not self._parar.is_set():
+            lote = self._aguardar_lote()
+            if lote:
+                self._enviar_com_tentativas(lote)
+
+    def _enviar_com_tentativas(self, lote, tentativas=None):
+        tentativas = tentativas or self.tentativas
+        espera = self.espera_inicial
+        try:
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    with medir("sync"):
+                        self._enviar()
+                    with self._condicao:
+                        self.enviados += 1
+                        self.ultimo_sucesso = datetime.now()
+                    logging.info(f"Arquivo enviado com sucesso para o Dropbox ({lote} gravação(ões) agrupada(s)).")
+                    return True
+                except Exception as e:
+                    with self._condicao:
+                        self.falhas += 1
+                        self.ultimo_erro = str(e)
+                    logging.error(f"Erro ao enviar o arquivo para o Dropbox (tentativa {tentativa}): {e}")
+                    if tentativa < tentativas and self._parar.wait(espera):
+                        break
+                    espera = min(espera * 2, self.espera_maxima)
+            # Esgotou as tentativas: devolve o lote para a fila
+            with self._condicao:
+                if self.pendentes == 0:
+                    self._primeira_escrita = self._ultima_escrita = time.monotonic()
+                self.pendentes += lote
+            return False
+        finally:
+            with self._condicao:
+                self._enviando = False
+
+    def _enviar(self):
+        if self.preparar is not None:
+            # Ex.: exportar o repositório para o JSON que é enviado
+            self.preparar()
+        modo = dropbox.files.WriteMode.overwrite
+        with open(self.caminho_local, "rb") as f:
+            tamanho = os.fstat(f.fileno()).st_size
+            if tamanho <= LIMITE_UPLOAD_SIMPLES:
+                self.cliente.files_upload(f.read(), self.caminho_dropbox, mode=modo)
+                return
+            sessao = self.cliente.files_upload_session_start(f.read(BLOCO_UPLOAD_SESSAO))
+            cursor = dropbox.files.UploadSessionCursor(session_id=sessao.session_id, offset=f.tell())
+            while tamanho - f.tell() > BLOCO_UPLOAD_SESSAO:
+                self.cliente.files_upload_session_append_v2(f.read(BLOCO_UPLOAD_SESSAO), cursor)
+                cursor.offset = f.tell()
+            commit = dropbox.files.CommitInfo(path=self.caminho_dropbox, mode=modo)
+            self.cliente.files_upload_session_finish(f.read(), cursor, commit)
+
+    # Enviar imediatamente o que estiver pendente (usado ao encerrar o worker)
+    def descarregar(self):
+        self._parar.set()
+        with self._condicao:
+            self._condicao.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.espera_maxima)
+            self._thread = None
+        with self._condicao:
+            lote = self.pendentes
+            self.pendentes = 0
+        if lote:
+            self._enviar_com_tentativas(lote, tentativas=1)
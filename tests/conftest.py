@@ -0,0 +1,39 @@
+import atexit
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+# Os módulos do app ficam na raiz do repositório, sem pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Importar um app novo em tmp_path, com o Dropbox simulado e a sincronização
+# periódica desligada. O app lê a configuração do ambiente e usa caminhos
+# relativos, por isso o diretório atual muda durante o teste.
+@pytest.fixture
+def carregar_app(tmp_path, monkeypatch):
+    carregados = []
+
+    def carregar(anotacoes=(), **ambiente):
+        (tmp_path / "anotacoes_culto.json").write_text(json.dumps(list(anotacoes)), encoding="utf-8")
+        monkeypatch.chdir(tmp_path)
+        configuracao = {"DROPBOX_FAKE_DIR": str(tmp_path / "dropbox"), "DROPBOX_SYNC_INTERVAL": "0",
+                        "DROPBOX_UPLOAD_WINDOW": "0", "ARMAZENAMENTO": "json", **ambiente}
+        for chave, valor in configuracao.items():
+            monkeypatch.setenv(chave, valor)
+        sys.modules.pop("app", None)
+        aplicacao = importlib.import_module("app")
+        carregados.append(aplicacao)
+        return aplicacao
+
+    yield carregar
+    for aplicacao in carregados:
+        aplicacao.fila_upload.descarregar()
+        aplicacao.sincronizador.parar()
+        # O backup de saída usaria o diretório atual do fim da sessão
+        atexit.unregister(aplicacao.fila_upload.descarregar)
+        atexit.unregister(aplicacao.criar_backup)
+    sys.modules.pop("app", None)
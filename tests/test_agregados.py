@@ -0,0 +1,50 @@
+from agregados import Agregados
+
+
+class RepositorioFalso:
+    def __init__(self, anotacoes):
+        self.anotacoes = {a["id"]: a for a in anotacoes}
+        self._observadores = []
+
+    def observar(self, funcao):
+        self._observadores.append(funcao)
+
+    def revalidar(self):
+        pass
+
+    def listar(self):
+        return list(self.anotacoes.values())
+
+    def notificar(self, evento, dados):
+        if evento == "remover":
+            del self.anotacoes[dados]
+        else:
+            self.anotacoes[dados["id"]] = dados
+        for funcao in self._observadores:
+            funcao(evento, dados)
+
+
+def anotacao(id, data, tema, passagem):
+    return {"id": id, "data": data, "tema": tema, "passagem_biblica": passagem}
+
+
+def test_resumo_incremental_igual_a_reconstrucao():
+    repositorio = RepositorioFalso([
+        anotacao(1, "01/01/2024", "Graça", "Ef 2:8"),
+        anotacao(2, "08/01/2024", "Fé", "Hb 11:1"),
+        anotacao(3, "09/01/2024", "Graça", "Gn 1:1"),
+    ])
+    agregados = Agregados(repositorio)
+    agregados.resumo()
+
+    repositorio.notificar("adicionar", anotacao(4, "10/01/2024", "Fé", "Ef 2:10"))
+    repositorio.notificar("editar", anotacao(1, "15/01/2024", "Fé", "Ef 1:3"))
+    repositorio.notificar("remover", 2)
+    resumo = agregados.resumo()
+    assert agregados.reconstrucoes == 1
+
+    assert resumo == Agregados(repositorio).resumo()
+    assert resumo["temas"] == [{"tema": "Fé", "quantidade": 2}, {"tema": "Graça", "quantidade": 1}]
+    assert [l["livro"] for l in resumo["livros"]] == ["Gênesis", "Efésios"]
+    assert [p["passagem"] for p in resumo["livros"][1]["passagens"]] == ["Ef 1:3", "Ef 2:10"]
+    assert [(s["semana"], s["quantidade"]) for s in resumo["semanas"]] == [("2024-W02", 2), ("2024-W03", 1)]
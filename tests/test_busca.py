@@ -0,0 +1,103 @@
+import threading
+import time
+
+from busca import IndiceBusca, montar_trecho
+from repositorio import RepositorioJSON
+
+
+def anotacao(id_anotacao=None, tema="Graça", texto="A graça de Deus basta"):
+    dados = {"data": "01/01/2024", "tema": tema, "passagem_biblica": "2Co 12:9",
+             "anotacoes_culto": texto, "devocional": "Fé e esperança"}
+    if id_anotacao is not None:
+        dados["id"] = id_anotacao
+    return dados
+
+
+def ids(resultados):
+    return sorted(r["anotacao"]["id"] for r in resultados)
+
+
+def test_indice_remover_e_adicionar_depois_de_buscar():
+    indice = IndiceBusca()
+    indice.reconstruir([anotacao(1), anotacao(2), anotacao(3)])
+    assert ids(indice.buscar("graca")) == [1, 2, 3]
+    indice.remover(2)
+    indice.adicionar(anotacao(4))
+    assert ids(indice.buscar("graca")) == [1, 3, 4]
+
+
+def test_indice_editar_atualiza_normalizacao():
+    indice = IndiceBusca()
+    indice.reconstruir([anotacao(1), anotacao(2)])
+    indice.buscar("graca")
+    indice.adicionar(anotacao(2, texto="graça " + "palavra " * 200))
+    resultados = indice.buscar("graca")
+    # A anotação longa tem a mesma frequência do termo, mas pontua menos pelo tamanho
+    assert [r["anotacao"]["id"] for r in resultados] == [1, 2]
+
+
+def test_repositorio_json_deletar_adicionar_buscar(tmp_path):
+    repositorio = RepositorioJSON(str(tmp_path / "anotacoes_culto.json"))
+    for _ in range(3):
+        repositorio.adicionar(anotacao())
+    assert ids(repositorio.buscar("graca")) == [1, 2, 3]
+    repositorio.remover(2)
+    repositorio.adicionar(anotacao())
+    assert ids(repositorio.buscar("graca")) == [1, 3, 4]
+
+
+def test_escrita_durante_reconstrucao_entra_no_indice_novo(tmp_path, monkeypatch):
+    repositorio = RepositorioJSON(str(tmp_path / "anotacoes_culto.json"))
+    repositorio.adicionar(anotacao())
+    reconstruir = IndiceBusca.reconstruir
+
+    def reconstruir_com_escrita(indice, anotacoes):
+        # A trava do repositório está livre durante a reconstrução
+        monkeypatch.setattr(IndiceBusca, "reconstruir", reconstruir)
+        repositorio.adicionar(anotacao())
+        reconstruir(indice, anotacoes)
+
+    monkeypatch.setattr(IndiceBusca, "reconstruir", reconstruir_com_escrita)
+    repositorio.buscar("graca")
+    assert ids(repositorio.buscar("graca")) == [1, 2]
+
+
+def test_escrita_de_outro_worker_atualiza_o_indice_sem_reconstruir(tmp_path):
+    caminho = str(tmp_path / "anotacoes_culto.json")
+    outro_worker, repositorio = RepositorioJSON(caminho), RepositorioJSON(caminho)
+    for _ in range(20):
+        outro_worker.adicionar(anotacao())
+    assert len(repositorio.buscar("graca", limite=50)) == 20
+
+    outro_worker.adicionar(anotacao(texto="Misericórdia"))
+    outro_worker.editar(1, anotacao(texto="Misericórdia renovada"))
+    outro_worker.remover(2)
+    assert ids(repositorio.buscar("misericordia")) == [1, 21]
+    assert ids(repositorio.buscar("graca", limite=50)) == [1] + list(range(3, 22))
+    assert repositorio.estatisticas()["reconstrucoes_indice"] == 1
+
+
+def test_buscas_simultaneas_reconstroem_o_indice_uma_vez(tmp_path, monkeypatch):
+    repositorio = RepositorioJSON(str(tmp_path / "anotacoes_culto.json"))
+    repositorio.adicionar(anotacao())
+    reconstruir = IndiceBusca.reconstruir
+
+    def reconstruir_devagar(indice, anotacoes):
+        time.sleep(0.2)
+        reconstruir(indice, anotacoes)
+
+    monkeypatch.setattr(IndiceBusca, "reconstruir", reconstruir_devagar)
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(ids(repositorio.buscar("graca")))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert resultados == [[1]] * 4
+    assert repositorio.estatisticas()["reconstrucoes_indice"] == 1
+
+
+def test_montar_trecho_destaca_termos_com_e_sem_acento():
+    trecho = montar_trecho("No início, a Graça; depois graça & paz", {"graca"})
+    assert str(trecho) == "No início, a <mark>Graça</mark>; depois <mark>graça</mark> &amp; paz"
+    assert montar_trecho("nada aqui", {"graca"}) is None
@@ -0,0 +1,91 @@
+import json
+import os
+
+from diario import RepositorioDiario
+
+ANOTACAO = {"data": "01/01/2024", "tema": "Graça", "passagem_biblica": "Ef 2:8",
+            "anotacoes_culto": "Pela graça", "devocional": "Fé"}
+
+
+def novo_repositorio(tmp_path, **opcoes):
+    opcoes.setdefault("limite_compactacao", 10 ** 6)
+    return RepositorioDiario(str(tmp_path / "anotacoes_culto.json"), fsync=False, **opcoes)
+
+
+def ids(repositorio):
+    return sorted(a["id"] for a in repositorio.listar())
+
+
+def test_diario_reaplicado_em_nova_instancia(tmp_path):
+    repositorio = novo_repositorio(tmp_path)
+    for _ in range(3):
+        repositorio.adicionar(ANOTACAO)
+    assert repositorio.editar(2, dict(ANOTACAO, tema="Fé"))
+    assert repositorio.remover(1)
+
+    outro = novo_repositorio(tmp_path)
+    assert ids(outro) == [2, 3]
+    assert outro.obter(2)["tema"] == "Fé"
+    # O id removido não volta a ser usado
+    assert outro.adicionar(ANOTACAO) == 4
+
+
+def test_ultima_linha_interrompida_e_ignorada(tmp_path):
+    repositorio = novo_repositorio(tmp_path)
+    repositorio.adicionar(ANOTACAO)
+    with open(repositorio.caminho_diario, "ab") as f:
+        f.write(b'{"op": "adicionar", "id": 2, "anot')
+
+    outro = novo_repositorio(tmp_path)
+    assert ids(outro) == [1]
+    assert outro.adicionar(ANOTACAO) == 2
+    assert ids(novo_repositorio(tmp_path)) == [1, 2]
+    with open(outro.caminho_diario, "rb") as f:
+        assert all(json.loads(linha) for linha in f)
+
+
+def test_outro_processo_le_so_a_cauda(tmp_path):
+    r1, r2 = novo_repositorio(tmp_path), novo_repositorio(tmp_path)
+    r1.adicionar(ANOTACAO)
+    assert ids(r2) == [1]
+    recargas = []
+    r2.observar(lambda evento, dados: recargas.append(evento))
+
+    r1.adicionar(ANOTACAO)
+    r1.remover(1)
+    assert ids(r2) == [2]
+    assert recargas == ["adicionar", "remover"]
+
+
+def test_compactacao_preserva_o_estado(tmp_path):
+    repositorio = novo_repositorio(tmp_path)
+    for _ in range(5):
+        repositorio.adicionar(ANOTACAO)
+    repositorio.remover(5)
+    assert repositorio.compactar()
+    assert repositorio.estatisticas()["operacoes_no_diario"] == 0
+
+    outro = novo_repositorio(tmp_path)
+    assert ids(outro) == [1, 2, 3, 4]
+    assert outro.adicionar(ANOTACAO) == 6
+
+
+def test_compactacao_com_inode_reaproveitado(tmp_path):
+    r1, r2 = novo_repositorio(tmp_path), novo_repositorio(tmp_path)
+    r1.adicionar(ANOTACAO)
+    assert ids(r2) == [1]
+
+    for _ in range(2):
+        for _ in range(5):
+            r1.adicionar(ANOTACAO)
+        assert r1.compactar()
+    r1.adicionar(ANOTACAO)
+    r1.adicionar(ANOTACAO)
+
+    # O diário novo recebeu o inode que r2 tinha em cache
+    r2._inode = os.stat(r2.caminho_diario).st_ino
+    assert ids(r2) == list(range(1, 14))
+
+    r2.adicionar(ANOTACAO)
+    assert r2.compactar()
+    assert ids(novo_repositorio(tmp_path)) == list(range(1, 15))
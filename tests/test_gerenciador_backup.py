@@ -0,0 +1,21 @@
+import json
+
+from gerenciador_backup import GerenciadorBackup
+
+
+def test_importar_legados_mantem_todas_as_copias(tmp_path):
+    diretorio = tmp_path / "backups"
+    diretorio.mkdir()
+    for dia in range(1, 6):
+        anotacoes = [{"id": i, "tema": "Graça"} for i in range(1, dia + 1)]
+        (diretorio / f"anotacoes_culto_backup_202001{dia:02d}_120000.json").write_text(json.dumps(anotacoes))
+    gerenciador = GerenciadorBackup(str(diretorio), str(tmp_path / "anotacoes_culto.json"),
+                                    reter_horas=1, reter_dias=1, reter_semanas=1)
+
+    assert gerenciador.importar_legados() == (5, 0)
+    assert [s["anotacoes"] for s in gerenciador.listar()] == [1, 2, 3, 4, 5]
+    assert gerenciador.verificar() == []
+
+    # Reimportar não duplica; a retenção só é aplicada quando pedida
+    assert gerenciador.importar_legados() == (0, 5)
+    assert len(gerenciador.podar()) == 4
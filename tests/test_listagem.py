@@ -0,0 +1,79 @@
+import pytest
+
+from repositorio import criar_repositorio
+
+
+def anotacao(data, tema, passagem):
+    return {"data": data, "tema": tema, "passagem_biblica": passagem,
+            "anotacoes_culto": f"Culto de {data}", "devocional": "Oração"}
+
+
+ANOTACOES = [
+    anotacao("07/01/2024", "Graça", "Ef 2:8"),
+    anotacao("14/01/2024", "Fé", "Hb 11:1"),
+    anotacao("21/01/2024", "Graça", "1Co 13:4-7"),
+    anotacao("data ruim", "Graça", "Gn 1:1"),
+    anotacao("04/02/2024", "Amor", "1 Coríntios 13:13"),
+]
+
+
+def temas_e_datas(anotacoes):
+    return [(a["tema"], a["data"]) for a in anotacoes]
+
+
+@pytest.mark.parametrize("armazenamento", ["json", "diario", "sqlite"])
+def test_consultar_filtra_ordena_e_pagina(tmp_path, armazenamento):
+    repositorio = criar_repositorio(armazenamento, str(tmp_path / "anotacoes_culto.json"))
+    for dados in ANOTACOES:
+        repositorio.adicionar(dados)
+
+    pagina, total = repositorio.consultar(limite=2, deslocamento=0)
+    assert total == 5
+    assert [a["data"] for a in pagina] == ["04/02/2024", "21/01/2024"]
+    # Datas inválidas ficam no fim da ordem decrescente
+    pagina, _ = repositorio.consultar(limite=2, deslocamento=4)
+    assert [a["data"] for a in pagina] == ["data ruim"]
+
+    pagina, total = repositorio.consultar(tema="Graça", ordem="data_asc")
+    assert total == 3
+    assert [a["data"] for a in pagina][1:] == ["07/01/2024", "21/01/2024"]
+
+    pagina, total = repositorio.consultar(livro="1 Coríntios")
+    assert temas_e_datas(pagina) == [("Amor", "04/02/2024"), ("Graça", "21/01/2024")]
+
+    pagina, total = repositorio.consultar(data_inicio="2024-01-10", data_fim="2024-01-31", ordem="id")
+    assert temas_e_datas(pagina) == [("Fé", "14/01/2024"), ("Graça", "21/01/2024")]
+
+
+def test_listagem_pagina_e_limita_parametros(carregar_app, monkeypatch):
+    aplicacao = carregar_app([dict(anotacao(f"{dia:02d}/03/2024", "Graça", "Sl 23:1"), id=dia)
+                              for dia in range(1, 26)])
+    cliente = aplicacao.app.test_client()
+
+    texto = cliente.get("/?por_pagina=10&pagina=2").get_data(as_text=True)
+    assert "Página 2 de 3" in texto
+    assert "15/03/2024" in texto and "16/03/2024" not in texto and "05/03/2024" not in texto
+
+    # Página além do fim (inclusive enorme) mostra a última; zero ou negativa, a primeira
+    for pagina in ("4", str(10 ** 30)):
+        resposta = cliente.get(f"/?por_pagina=10&pagina={pagina}")
+        assert resposta.status_code == 200
+        assert "Página 3 de 3" in resposta.get_data(as_text=True)
+    assert "Página 1 de 3" in cliente.get("/?por_pagina=10&pagina=-5").get_data(as_text=True)
+
+    # por_pagina acima do máximo é limitado
+    monkeypatch.setattr(aplicacao, "POR_PAGINA_MAXIMO", 10)
+    assert "Página 1 de 3" in cliente.get("/?por_pagina=1000").get_data(as_text=True)
+
+
+def test_listagem_filtros_da_query_string(carregar_app):
+    aplicacao = carregar_app([dict(dados, id=i) for i, dados in enumerate(ANOTACOES, 1)])
+    cliente = aplicacao.app.test_client()
+
+    texto = cliente.get("/?livro=1co").get_data(as_text=True)
+    assert "2 anotação(ões)" in texto
+    texto = cliente.get("/?tema=Graça&de=2024-01-01&ate=15/01/2024").get_data(as_text=True)
+    assert "1 anotação(ões)" in texto and "07/01/2024" in texto
+
+    exportado = cliente.get("/exportar?tema=Graça").get_data(as_text=True)
+    assert "Culto de 07/01/2024" in exportado and "Culto de 14/01/2024" not in exportado
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from metricas import ClienteInstrumentado, Metricas
+
+
+def test_exportar_no_formato_do_prometheus():
+    metricas = Metricas()
+    metricas.descrever("fase_segundos", "Tempo por fase.")
+    metricas.observar("fase_segundos", 0.003, fase="parse")
+    metricas.observar("fase_segundos", 20.0, fase="parse")
+    metricas.incrementar("requisicoes_total", rota='/a"b', status=200)
+
+    linhas = metricas.exportar({"fila": {"ocupada": True, "ultimo": datetime(2024, 1, 1), "erro": "x"}}).splitlines()
+    assert "# HELP anotacoes_fase_segundos Tempo por fase." in linhas
+    assert "# TYPE anotacoes_fase_segundos histogram" in linhas
+    # Buckets cumulativos; acima do maior limite só entra no +Inf
+    assert 'anotacoes_fase_segundos_bucket{fase="parse",le="0.0025"} 0' in linhas
+    assert 'anotacoes_fase_segundos_bucket{fase="parse",le="0.005"} 1' in linhas
+    assert 'anotacoes_fase_segundos_bucket{fase="parse",le="10.0"} 1' in linhas
+    assert 'anotacoes_fase_segundos_bucket{fase="parse",le="+Inf"} 2' in linhas
+    assert 'anotacoes_fase_segundos_sum{fase="parse"} 20.003' in linhas
+    assert 'anotacoes_fase_segundos_count{fase="parse"} 2' in linhas
+    assert 'anotacoes_requisicoes_total{rota="/a\\"b",status="200"} 1' in linhas
+    assert "anotacoes_fila_ocupada 1" in linhas
+    assert "anotacoes_fila_ultimo " + repr(datetime(2024, 1, 1).timestamp()) in linhas
+    assert not [linha for linha in linhas if linha.startswith("anotacoes_fila_erro")]
+
+
+def test_fases_atribuidas_a_requisicao_da_thread(tmp_path):
+    metricas = Metricas(caminho_log=str(tmp_path / "metricas.jsonl"))
+    outra_thread_mediu = threading.Event()
+
+    def medir_fora_da_requisicao():
+        with metricas.medir("sync"):
+            pass
+        outra_thread_mediu.set()
+
+    token = metricas.iniciar_requisicao()
+    with metricas.medir("parse"):
+        time.sleep(0.01)
+    with metricas.medir("parse"):
+        pass
+    threading.Thread(target=medir_fora_da_requisicao).start()
+    assert outra_thread_mediu.wait(5)
+    assert list(metricas.medir_iteracao("render", iter("abc"))) == ["a", "b", "c"]
+    metricas.finalizar_requisicao(token, "GET", "/", 200, 0.05)
+
+    registro = json.loads((tmp_path / "metricas.jsonl").read_text(encoding="utf-8"))
+    assert (registro["metodo"], registro["rota"], registro["status"], registro["duracao_ms"]) == ("GET", "/", 200, 50.0)
+    # A sincronização de outra thread não entra nas fases desta requisição
+    assert sorted(registro["fases_ms"]) == ["parse", "render"]
+    assert registro["fases_ms"]["parse"] >= 10
+    exportado = metricas.exportar()
+    assert 'anotacoes_fase_segundos_count{fase="parse"} 2' in exportado
+    assert 'anotacoes_fase_segundos_count{fase="sync"} 1' in exportado
+
+
+def test_cliente_instrumentado_conta_chamadas_e_erros():
+    class Cliente:
+        versao = "1"
+
+        def files_get_metadata(self, caminho):
+            if caminho == "/falta":
+                raise LookupError(caminho)
+            return caminho
+
+    metricas = Metricas()
+    cliente = ClienteInstrumentado(Cliente(), metricas)
+    assert cliente.versao == "1"
+    assert cliente.files_get_metadata("/a") == "/a"
+    with pytest.raises(LookupError):
+        cliente.files_get_metadata("/falta")
+
+    exportado = metricas.exportar()
+    for resultado in ("ok", "erro"):
+        assert (f'anotacoes_chamadas_externas_total{{metodo="files_get_metadata",resultado="{resultado}",'
+                f'servico="dropbox"}} 1') in exportado
+    assert 'anotacoes_chamada_externa_segundos_count{metodo="files_get_metadata",servico="dropbox"} 2' in exportado
+
+
+def test_rota_metrics_e_log_das_requisicoes(carregar_app, tmp_path, monkeypatch):
+    aplicacao = carregar_app([{"id": 1, "data": "01/01/2024", "tema": "Graça", "passagem_biblica": "Ef 2:8",
+                               "anotacoes_culto": "Pela graça", "devocional": "Fé"}])
+    monkeypatch.setattr(aplicacao.metricas, "caminho_log", str(tmp_path / "metricas.jsonl"))
+    cliente = aplicacao.app.test_client()
+    assert cliente.get("/").status_code == 200
+    assert cliente.get("/editar/999").status_code == 404
+
+    texto = cliente.get("/metrics").get_data(as_text=True)
+    assert 'anotacoes_requisicoes_total{metodo="GET",rota="/",status="200"}' in texto
+    assert 'anotacoes_requisicoes_total{metodo="GET",rota="/editar/<int:id_anotacao>",status="404"}' in texto
+    for medidor in ("anotacoes_repositorio_falhas", "anotacoes_fila_upload_profundidade", "anotacoes_agregados_anotacoes"):
+        assert f"# TYPE {medidor} gauge" in texto
+
+    registros = [json.loads(linha) for linha in open(tmp_path / "metricas.jsonl", encoding="utf-8")]
+    listagem = next(r for r in registros if r["rota"] == "/")
+    assert {"load", "parse", "render"} <= set(listagem["fases_ms"])
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from repositorio import RepositorioJSON, criar_repositorio
+
+ANOTACAO = {"data": "01/01/2024", "tema": "Graça", "passagem_biblica": "Ef 2:8",
+            "anotacoes_culto": "Pela graça", "devocional": "Fé"}
+
+
+def test_json_nao_reaproveita_id_da_ultima_anotacao_removida(tmp_path):
+    caminho = str(tmp_path / "anotacoes_culto.json")
+    repositorio = RepositorioJSON(caminho)
+    assert repositorio.adicionar(ANOTACAO) == 1
+    assert repositorio.adicionar(ANOTACAO) == 2
+    assert repositorio.remover(2)
+    assert repositorio.adicionar(ANOTACAO) == 3
+
+    # Outro worker (instância nova) continua a sequência
+    outro = RepositorioJSON(caminho)
+    assert outro.remover(3)
+    assert outro.adicionar(ANOTACAO) == 4
+    assert [a["id"] for a in outro.listar()] == [1, 4]
+
+
+@pytest.mark.parametrize("armazenamento", ["json", "diario", "sqlite"])
+def test_mesclar_nao_reaproveita_id_removido(tmp_path, armazenamento):
+    repositorio = criar_repositorio(armazenamento, str(tmp_path / "anotacoes_culto.json"))
+    for _ in range(3):
+        repositorio.adicionar(ANOTACAO)
+    assert repositorio.remover(3)
+
+    assert repositorio.mesclar([dict(ANOTACAO, tema="Nova")]) == 1
+    assert [(a["id"], a["tema"]) for a in repositorio.listar()] == [(1, "Graça"), (2, "Graça"), (4, "Nova")]
+    assert repositorio.adicionar(ANOTACAO) == 5
+
+
+def test_json_importar_respeita_proximo_id(tmp_path):
+    repositorio = RepositorioJSON(str(tmp_path / "anotacoes_culto.json"))
+    repositorio.adicionar(ANOTACAO)
+    repositorio.adicionar(ANOTACAO)
+    repositorio.remover(2)
+
+    repositorio.importar(repositorio.listar() + [dict(ANOTACAO, tema="Sem id")])
+    assert [a["id"] for a in repositorio.listar()] == [1, 3]
+    assert RepositorioJSON(repositorio.caminho).adicionar(ANOTACAO) == 4
+
+
+def test_sqlite_mesclar_notifica_cada_anotacao_nova(tmp_path):
+    repositorio = criar_repositorio("sqlite", str(tmp_path / "anotacoes_culto.json"))
+    repositorio.adicionar(ANOTACAO)
+    eventos = []
+    repositorio.observar(lambda evento, dados: eventos.append((evento, dados["id"], dados["tema"])))
+    versao = repositorio.versao()
+
+    assert repositorio.mesclar([ANOTACAO, dict(ANOTACAO, tema="Nova")]) == 1
+    assert eventos == [("adicionar", 2, "Nova")]
+    assert repositorio.versao() != versao
+
+
+def test_json_cache_so_rele_o_arquivo_quando_ele_muda(tmp_path):
+    caminho = str(tmp_path / "anotacoes_culto.json")
+    repositorio = RepositorioJSON(caminho)
+    repositorio.adicionar(ANOTACAO)
+    repositorio.listar()
+    repositorio.listar()
+    # A própria escrita já atualiza a assinatura: não há releitura
+    assert (repositorio.acertos, repositorio.falhas) == (2, 1)
+
+    RepositorioJSON(caminho).editar(1, dict(ANOTACAO, tema="Fé"))
+    assert repositorio.obter(1)["tema"] == "Fé"
+    assert repositorio.falhas == 2
+
+    repositorio.invalidar()
+    repositorio.listar()
+    assert repositorio.falhas == 3
+
+
+def test_json_arquivo_ausente_chama_ao_faltar_arquivo(tmp_path):
+    caminho = tmp_path / "anotacoes_culto.json"
+    chamadas = []
+
+    def baixar():
+        chamadas.append(True)
+        caminho.write_text(json.dumps([dict(ANOTACAO, id=7)]), encoding="utf-8")
+
+    repositorio = RepositorioJSON(str(caminho), ao_faltar_arquivo=baixar)
+    assert [a["id"] for a in repositorio.listar()] == [7]
+    assert [a["id"] for a in repositorio.listar()] == [7]
+    assert chamadas == [True]
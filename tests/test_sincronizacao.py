@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from repositorio import RepositorioJSON, criar_repositorio, ler_json_anotacoes
+from sincronizacao import ClienteDropboxFalso, FilaUpload, SincronizadorDropbox
+
+ANOTACAO = {"data": "01/01/2024", "tema": "Graça", "passagem_biblica": "Ef 2:8",
+            "anotacoes_culto": "Pela graça", "devocional": "Fé"}
+
+
+# Cliente falso cujo download só termina quando o teste liberar
+class ClienteLento(ClienteDropboxFalso):
+    def __init__(self, diretorio):
+        super().__init__(diretorio)
+        self.baixando = threading.Event()
+        self.liberar = threading.Event()
+
+    def files_download_to_file(self, caminho_local, caminho_dropbox):
+        metadata = super().files_download_to_file(caminho_local, caminho_dropbox)
+        self.baixando.set()
+        self.liberar.wait(5)
+        return metadata
+
+
+def preparar(tmp_path):
+    local = tmp_path / "anotacoes_culto.json"
+    local.write_text(json.dumps([dict(ANOTACAO, tema="Local")]), encoding="utf-8")
+    os.utime(local, (time.time() - 3600, time.time() - 3600))
+    remoto = tmp_path / "dropbox" / "anotacoes_culto.json"
+    remoto.parent.mkdir()
+    remoto.write_text(json.dumps([dict(ANOTACAO, tema="Remoto")]), encoding="utf-8")
+    return str(local), ClienteLento(str(remoto.parent))
+
+
+def sincronizar_com_escrita(sincronizador, cliente, escrever):
+    resultado = {}
+    thread = threading.Thread(target=lambda: resultado.setdefault("baixou", sincronizador.sincronizar_agora()))
+    thread.start()
+    assert cliente.baixando.wait(5)
+    escrever()
+    cliente.liberar.set()
+    thread.join(5)
+    return resultado["baixou"]
+
+
+def test_escrita_durante_download_nao_e_sobrescrita(tmp_path):
+    local, cliente = preparar(tmp_path)
+    repositorio = RepositorioJSON(local)
+    sincronizador = SincronizadorDropbox(
+        cliente, "/anotacoes_culto.json", local, intervalo=0,
+        trava=repositorio.travar_escritas(), versao_local=repositorio.versao,
+    )
+
+    baixou = sincronizar_com_escrita(sincronizador, cliente, lambda: repositorio.adicionar(ANOTACAO))
+
+    assert baixou is False
+    assert [a["tema"] for a in repositorio.listar()] == ["Local", "Graça"]
+    assert not [nome for nome in os.listdir(tmp_path) if nome.startswith(".download_")]
+
+
+@pytest.mark.parametrize("armazenamento", ["diario", "sqlite"])
+def test_escrita_de_outro_worker_durante_download_nao_e_apagada(tmp_path, armazenamento):
+    local, cliente = preparar(tmp_path)
+    # Dois workers sobre o mesmo armazenamento; o sync roda no worker_b
+    worker_a = criar_repositorio(armazenamento, local)
+    worker_b = criar_repositorio(armazenamento, local)
+    assert [a["tema"] for a in worker_a.listar()] == [a["tema"] for a in worker_b.listar()] == ["Local"]
+    sincronizador = SincronizadorDropbox(
+        cliente, "/anotacoes_culto.json", local, intervalo=0,
+        trava=worker_b.travar_escritas(), versao_local=worker_b.versao,
+        ao_baixar=lambda: worker_b.importar(ler_json_anotacoes(local)),
+    )
+
+    baixou = sincronizar_com_escrita(sincronizador, cliente, lambda: worker_a.adicionar(ANOTACAO))
+
+    assert baixou is False
+    assert [a["tema"] for a in worker_a.listar()] == ["Local", "Graça"]
+    assert [a["tema"] for a in worker_b.listar()] == ["Local", "Graça"]
+
+
+def test_upload_pendente_durante_download_descarta_versao_remota(tmp_path):
+    local, cliente = preparar(tmp_path)
+    repositorio = RepositorioJSON(local)
+    fila = FilaUpload(cliente, local, "/anotacoes_culto.json", janela=2)
+    sincronizador = SincronizadorDropbox(cliente, "/anotacoes_culto.json", local, intervalo=0, fila_upload=fila)
+
+    def escrever():
+        repositorio.adicionar(ANOTACAO)
+        fila.agendar()
+
+    assert sincronizar_com_escrita(sincronizador, cliente, escrever) is False
+    fila.descarregar()
+    enviado = json.loads((tmp_path / "dropbox" / "anotacoes_culto.json").read_text(encoding="utf-8"))
+    assert [a["tema"] for a in enviado] == ["Local", "Graça"]
+
+
+def test_sem_escrita_local_a_versao_remota_e_baixada(tmp_path):
+    local, cliente = preparar(tmp_path)
+    cliente.liberar.set()
+    repositorio = RepositorioJSON(local)
+    sincronizador = SincronizadorDropbox(
+        cliente, "/anotacoes_culto.json", local, intervalo=0,
+        trava=repositorio.travar_escritas(), versao_local=repositorio.versao,
+    )
+
+    assert sincronizador.sincronizar_agora() is True
+    assert [a["tema"] for a in repositorio.listar()] == ["Remoto"]
+
+
+def test_rotas_nao_consultam_o_dropbox(carregar_app):
+    aplicacao = carregar_app([ANOTACAO])
+    cliente = aplicacao.app.test_client()
+    for rota in ("/", "/?pagina=2", "/buscar?q=graça", "/resumo", "/editar/1"):
+        assert cliente.get(rota).status_code == 200
+    assert aplicacao.dbx._cliente.chamadas == {}
+
+
+def test_versao_remota_igual_nao_e_baixada(tmp_path):
+    local, cliente = preparar(tmp_path)
+    (tmp_path / "dropbox" / "anotacoes_culto.json").write_bytes(open(local, "rb").read())
+    sincronizador = SincronizadorDropbox(cliente, "/anotacoes_culto.json", local, intervalo=0)
+
+    assert sincronizador.sincronizar_agora() is False
+    assert "files_download_to_file" not in cliente.chamadas
+    assert sincronizador.ultima_verificacao is not None
+
+
+def test_copia_local_mais_nova_nao_e_sobrescrita(tmp_path):
+    local, cliente = preparar(tmp_path)
+    os.utime(local, None)
+    remoto = tmp_path / "dropbox" / "anotacoes_culto.json"
+    os.utime(remoto, (time.time() - 7200, time.time() - 7200))
+    sincronizador = SincronizadorDropbox(cliente, "/anotacoes_culto.json", local, intervalo=0)
+
+    assert sincronizador.sincronizar_agora() is False
+    assert [a["tema"] for a in ler_json_anotacoes(local)] == ["Local"]
+
+
+def test_arquivo_local_ausente_e_baixado(tmp_path):
+    local, cliente = preparar(tmp_path)
+    cliente.liberar.set()
+    os.remove(local)
+    repositorio = RepositorioJSON(local, ao_faltar_arquivo=SincronizadorDropbox(
+        cliente, "/anotacoes_culto.json", local, intervalo=0).baixar)
+
+    assert [a["tema"] for a in repositorio.listar()] == ["Remoto"]
+
+
+def test_sincronizacao_periodica_em_segundo_plano(tmp_path):
+    local, cliente = preparar(tmp_path)
+    cliente.liberar.set()
+    sincronizador = SincronizadorDropbox(cliente, "/anotacoes_culto.json", local, intervalo=0.05)
+    sincronizador.iniciar()
+    try:
+        assert cliente.baixando.wait(5)
+        for _ in range(100):
+            if sincronizador.ultimo_download is not None:
+                break
+            time.sleep(0.01)
+    finally:
+        sincronizador.parar()
+    assert [a["tema"] for a in ler_json_anotacoes(local)] == ["Remoto"]
+    assert cliente.chamadas["files_get_metadata"] >= 1
+